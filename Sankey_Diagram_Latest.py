@@ -1,32 +1,32 @@
-import pandas as pd
 import dash
-from dash import dcc, html, Input, Output
-import plotly.graph_objects as go
-import plotly.express as px
+from dash import dcc, html, Input, Output, Patch
+from functools import lru_cache
 import webbrowser
-from threading import Timer, Thread
+from threading import Timer
 import dash_bootstrap_components as dbc
-import os
-from http.server import SimpleHTTPRequestHandler
-from socketserver import TCPServer
-import socket
+
+from data_store import DataStore
+from figure_cache import FigureCache
+from timeseries import relayout_range
+from static_assets import StaticAssets
+from county_choropleth import fill, load_geometry
+from dashboard_figures import (build_dashboard_data, carrier_bar_figure, county_map_figure, extend_dashboard_data,
+                               heatmap_figure, histogram_figure, line_chart_figure, occupancy_figure,
+                               occupancy_stats_figure, pie_chart_figure, sankey_figure, stats)
+from export_aggregates import build_aggregates, dumps
+from flask import Response, request
+from instrumentation import metrics
 
 # Load data
 file_path = "Cleaned_Package_Data_County_FIPS.csv"  # Ensure this file is present in the working directory
-df = pd.read_csv(file_path)
-
-date_columns = ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]
-for col in date_columns:
-    df[col] = pd.to_datetime(df[col], format="%m/%d/%Y %H:%M", errors='coerce')
 
-df.dropna(subset=["Routed Date Time", "Delivered Date Time"], inplace=True)
+# Polls the file in the background and swaps in a rebuilt version when it changes, so new data shows up
+# without a restart. Callbacks read store.current once and use that version throughout.
+store = DataStore(file_path, build_dashboard_data, extend=extend_dashboard_data).start()
 
-df['Routed → Stored'] = (df['Stored Date Time'] - df['Routed Date Time']).dt.total_seconds() / 3600
-df['Stored → Delivered'] = (df['Delivered Date Time'] - df['Stored Date Time']).dt.total_seconds() / 3600
-df['Total Processing Time'] = (df['Delivered Date Time'] - df['Routed Date Time']).dt.total_seconds() / 3600
-
-# Explicitly cast NaN values in datetime columns to a compatible type
-df[date_columns] = df[date_columns].fillna(pd.Timestamp('1970-01-01'))
+# Rendered figures on disk, shared by every worker; keyed on the version being served. Each cached callback
+# gets that version as its first argument and reads only from it.
+figures = FigureCache(snapshot=lambda: store.current)
 
 # Read README.md content
 with open("README.md", "r", encoding="utf-8") as file:
@@ -35,198 +35,274 @@ with open("README.md", "r", encoding="utf-8") as file:
 # Initialize Dash App with a Modern Theme
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])
 app.title = "🚀 Ultimate Package Analytics Dashboard"
+DASH_PORT = 8050
+DASH_URL = f"http://127.0.0.1:{DASH_PORT}/"
 
-# Layout
-app.layout = dbc.Container([
-    html.Div([
-        html.H1("📦 Ultimate Package Tracking Dashboard 🚀",
-                style={'textAlign': 'center', 'color': '#FFD700', 'padding': '20px'}),
-        html.Hr(),
-    ], className="app-header"),
-
-    dbc.Row([
-        dbc.Col(html.Div([html.H4(f"📦 Total Packages: {len(df)}",
-                                  style={'color': '#FF4500', 'fontSize': '24px'})]), width=4),
-        dbc.Col(html.Div([html.H4(f"🚚 Top Carrier: {df['Carrier'].mode()[0]}",
-                                  style={'color': '#32CD32', 'fontSize': '24px'})]), width=4),
-        dbc.Col(html.Div([html.H4(f"⏳ Avg. Processing Time: {df['Total Processing Time'].mean():.2f} Hours",
-                                  style={'color': '#1E90FF', 'fontSize': '24px'})]), width=4)
-    ], className="mb-4 text-center dashboard-stats"),
-
-    dbc.Tabs([
-        dbc.Tab(label='📦 Package Flow', children=[
-            dbc.Card(
-                dbc.CardBody([
-                    html.H3("📊 Real-time Package Flow", className='card-title', style={'textAlign': 'center'}),
-                    dcc.Graph(id='sankey-graph')
-                ]),
-                className="mt-3 shadow-lg"
-            )
-        ]),
-        dbc.Tab(label='🌍 County Map', id='county-map-tab', children=[
-            dbc.Card(
-                dbc.CardBody([
-                    html.H3("🌍 County Map", className='card-title', style={'textAlign': 'center'}),
-                    html.Button("Open County Map", id="open-county-map", n_clicks=0)
-                ]),
-                className="mt-3 shadow-lg"
-            )
-        ]),
-        dbc.Tab(label='📈 Statistical Insights', children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H3("📊 Carrier Distribution", className='card-title', style={'textAlign': 'center'}),
-                            dcc.Graph(id='carrier-bar')
-                        ]),
-                        className="mt-3 shadow-lg"
-                    )
-                ], width=6),
-                dbc.Col([
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H3("📦 Package Processing Histogram", className='card-title', style={'textAlign': 'center'}),
-                            dcc.Graph(id='histogram')
-                        ]),
-                        className="mt-3 shadow-lg"
-                    )
-                ], width=6)
-            ])
-        ]),
-        dbc.Tab(label='📊 Additional Insights', children=[
-            dbc.Row([
-                dbc.Col([
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H3("📊 Processing Time Over Time", className='card-title', style={'textAlign': 'center'}),
-                            dcc.Graph(id='line-chart')
-                        ]),
-                        className="mt-3 shadow-lg"
-                    )
-                ], width=6),
-                dbc.Col([
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H3("📦 Package Volume by Carrier", className='card-title', style={'textAlign': 'center'}),
-                            dcc.Graph(id='pie-chart')
-                        ]),
-                        className="mt-3 shadow-lg"
-                    )
-                ], width=6)
+# countymaplog.html and the CSV it loads, served by the same (threaded) server under /files/
+static_assets = StaticAssets().register(app.server)
+
+# package_aggregates.json for the version being served, built once per version
+@lru_cache(maxsize=1)
+def aggregates_body(version):
+    return dumps(build_aggregates(version.frame, version.stamp, source=file_path)).encode()
+
+@app.server.route("/api/aggregates.json")
+def api_aggregates():
+    version = store.current
+    response = Response(aggregates_body(version), mimetype="application/json")
+    # Revalidated on every use, so a reload shows up at once; unchanged data costs an empty 304
+    response.set_etag(version.stamp)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Prometheus metrics, only when started with PACKAGE_METRICS=1 (see instrumentation.py)
+if metrics.enabled:
+    metrics.gauge("figure_cache_hits", lambda: figures.hits)
+    metrics.gauge("figure_cache_misses", lambda: figures.misses)
+    metrics.gauge("data_reloads", lambda: store.reloads)
+    metrics.gauge("data_appends", lambda: store.appends)
+    metrics.gauge("data_rows", lambda: len(store.current.frame))
+
+    @app.server.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+# Layout, rebuilt on every page load so filter choices match the data version being served
+def serve_layout():
+    data = store.data
+    # Converted once per topology file; the shapes go out with the page and are never sent again
+    geometry = load_geometry()
+    return dbc.Container([
+        html.Div([
+            html.H1("📦 Ultimate Package Tracking Dashboard 🚀",
+                    style={'textAlign': 'center', 'color': '#FFD700', 'padding': '20px'}),
+            html.Hr(),
+        ], className="app-header"),
+
+        dbc.Row([
+            dbc.Col(html.Div([html.H4(id='total-packages', style={'color': '#FF4500', 'fontSize': '24px'})]), width=4),
+            dbc.Col(html.Div([html.H4(id='top-carrier', style={'color': '#32CD32', 'fontSize': '24px'})]), width=4),
+            dbc.Col(html.Div([html.H4(id='avg-processing', style={'color': '#1E90FF', 'fontSize': '24px'})]), width=4)
+        ], className="mb-4 text-center dashboard-stats"),
+
+        # Filters shared by every chart below
+        dbc.Row([
+            dbc.Col(dcc.DatePickerRange(id='date-filter', min_date_allowed=data.first_day, max_date_allowed=data.last_day,
+                                        start_date=data.first_day, end_date=data.last_day), width=3),
+            dbc.Col(dcc.Dropdown(id='carrier-filter', options=data.cube.options('Carrier'), multi=True,
+                                 placeholder="All carriers"), width=3),
+            dbc.Col(dcc.Dropdown(id='bank-filter', options=data.cube.options('Locker Bank'), multi=True,
+                                 placeholder="All locker banks"), width=3),
+            dbc.Col(dcc.Dropdown(id='state-filter', options=data.cube.options('Origin State'), multi=True,
+                                 placeholder="All origin states"), width=3)
+        ], className="mb-4 dashboard-filters"),
+
+        dbc.Tabs([
+            dbc.Tab(label='📦 Package Flow', children=[
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H3("📊 Real-time Package Flow", className='card-title', style={'textAlign': 'center'}),
+                        dcc.Graph(id='sankey-graph')
+                    ]),
+                    className="mt-3 shadow-lg"
+                )
+            ]),
+            dbc.Tab(label='🌍 County Map', id='county-map-tab', children=[
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H3("🌍 County Map", className='card-title', style={'textAlign': 'center'}),
+                        dcc.RadioItems(id='county-scale', options=[{'label': ' Log scale', 'value': 'log'},
+                                                                   {'label': ' Linear scale', 'value': 'linear'}],
+                                       value='log', inline=True, inputStyle={'marginLeft': '15px'}),
+                        dcc.Graph(id='county-choropleth', figure=county_map_figure(data.counties, geometry)),
+                        html.Button("Open County Map", id="open-county-map", n_clicks=0)
+                    ]),
+                    className="mt-3 shadow-lg"
+                )
+            ]),
+            dbc.Tab(label='📈 Statistical Insights', children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H3("📊 Carrier Distribution", className='card-title', style={'textAlign': 'center'}),
+                                dcc.Graph(id='carrier-bar')
+                            ]),
+                            className="mt-3 shadow-lg"
+                        )
+                    ], width=6),
+                    dbc.Col([
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H3("📦 Package Processing Histogram", className='card-title', style={'textAlign': 'center'}),
+                                dcc.Graph(id='histogram')
+                            ]),
+                            className="mt-3 shadow-lg"
+                        )
+                    ], width=6)
+                ])
+            ]),
+            dbc.Tab(label='📊 Additional Insights', children=[
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H3("📊 Processing Time Over Time", className='card-title', style={'textAlign': 'center'}),
+                                dcc.Graph(id='line-chart')
+                            ]),
+                            className="mt-3 shadow-lg"
+                        )
+                    ], width=6),
+                    dbc.Col([
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H3("📦 Package Volume by Carrier", className='card-title', style={'textAlign': 'center'}),
+                                dcc.Graph(id='pie-chart')
+                            ]),
+                            className="mt-3 shadow-lg"
+                        )
+                    ], width=6)
+                ])
+            ]),
+            dbc.Tab(label='🔥 Heatmap & Trends', children=[
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H3("⏰ Package Pickup Heatmap", className='card-title', style={'textAlign': 'center'}),
+                        dcc.Graph(id='heatmap')
+                    ]),
+                    className="mt-3 shadow-lg"
+                )
+            ]),
+            dbc.Tab(label='🗄️ Locker Occupancy', children=[
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H3("🗄️ Locker Occupancy", className='card-title', style={'textAlign': 'center'}),
+                        dcc.Graph(id='occupancy-chart'),
+                        dcc.Graph(id='occupancy-stats')
+                    ]),
+                    className="mt-3 shadow-lg"
+                )
+            ]),
+            dbc.Tab(label='📄 README.md', children=[
+                dbc.Card(
+                    dbc.CardBody([
+                        html.H3("📄 Project Documentation", className='card-title', style={'textAlign': 'center'}),
+                        dcc.Markdown(readme_content)
+                    ]),
+                    className="mt-3 shadow-lg"
+                )
             ])
-        ]),
-        dbc.Tab(label='🔥 Heatmap & Trends', children=[
-            dbc.Card(
-                dbc.CardBody([
-                    html.H3("⏰ Package Pickup Heatmap", className='card-title', style={'textAlign': 'center'}),
-                    dcc.Graph(id='heatmap')
-                ]),
-                className="mt-3 shadow-lg"
-            )
-        ]),
-        dbc.Tab(label='📄 README.md', children=[
-            dbc.Card(
-                dbc.CardBody([
-                    html.H3("📄 Project Documentation", className='card-title', style={'textAlign': 'center'}),
-                    dcc.Markdown(readme_content)
-                ]),
-                className="mt-3 shadow-lg"
-            )
         ])
-    ])
-], fluid=True, className="app-container")
+    ], fluid=True, className="app-container")
+
+app.layout = serve_layout
 
 # Callbacks
-@app.callback(Output('sankey-graph', 'figure'), Input('sankey-graph', 'id'))
-def update_sankey(_):
-    sources = [0, 1, 1, 2, 2]
-    targets = [1, 2, 3, 3, 4]
-    values = [df['Routed → Stored'].mean(), df['Stored → Delivered'].mean(), 4000, 3200, 1200]
-    labels = ["📦 Arrived", "📍 Sorting", "📦 Storage", "🚀 Out for Delivery", "🏡 Delivered"]
-
-    fig = go.Figure(go.Sankey(
-        node=dict(pad=15, thickness=40, line=dict(color="black", width=1), label=labels),
-        link=dict(source=sources, target=targets, value=values)
-    ))
-    return fig
-
-@app.callback(Output('carrier-bar', 'figure'), Input('carrier-bar', 'id'))
-def update_carrier_bar(_):
-    carrier_counts = df['Carrier'].value_counts().reset_index()
-    carrier_counts.columns = ['Carrier', 'Count']
-    fig = px.bar(carrier_counts, x='Carrier', y='Count', title="📊 Carrier Distribution", color='Carrier')
-    return fig
-
-@app.callback(Output('histogram', 'figure'), Input('histogram', 'id'))
-def update_histogram(_):
-    fig = px.histogram(df, x="Total Processing Time", nbins=50, title="⏳ Processing Time Distribution")
-    return fig
-
-@app.callback(Output('line-chart', 'figure'), Input('line-chart', 'id'))
-def update_line_chart(_):
-    df_sorted = df.dropna(subset=['Routed Date Time']).sort_values(by='Routed Date Time')
-    fig = px.line(df_sorted, x="Routed Date Time", y="Total Processing Time", title="📊 Processing Time Over Time")
-    return fig
-
-@app.callback(Output('pie-chart', 'figure'), Input('pie-chart', 'id'))
-def update_pie_chart(_):
-    carrier_counts = df['Carrier'].value_counts().reset_index()
-    carrier_counts.columns = ['Carrier', 'Count']
-    fig = px.pie(carrier_counts, names='Carrier', values='Count', title="📦 Package Volume by Carrier")
-    return fig
-
-@app.callback(Output('heatmap', 'figure'), Input('heatmap', 'id'))
-def update_heatmap(_):
-    df['Hour of Day'] = df['Delivered Date Time'].dt.hour.fillna(0).astype(int)
-    df['Day of Week'] = df['Delivered Date Time'].dt.day_name().fillna("Unknown")
-    heatmap_data = df.groupby(['Day of Week', 'Hour of Day']).size().reset_index(name='Count')
-    fig = px.density_heatmap(heatmap_data, x='Hour of Day', y='Day of Week', z='Count', title="🔥 Pickup Trends")
-    return fig
+FILTERS = [Input('date-filter', 'start_date'), Input('date-filter', 'end_date'), Input('carrier-filter', 'value'),
+           Input('bank-filter', 'value'), Input('state-filter', 'value')]
+
+# Every chart asks for the same selection, so it is summed from the cube once per version and filter state
+@lru_cache(maxsize=32)
+@metrics.timed("cube_select")
+def selection(version, start, end, carriers, banks, states):
+    return version.data.cube.select(start, end, carriers, banks, states)
+
+selected_version = [None]
+
+def filtered(version, start, end, carriers, banks, states):
+    # Drop selections of the previous version so it can be freed once its callbacks finish
+    if version is not selected_version[0]:
+        selection.cache_clear()
+        selected_version[0] = version
+    return selection(version, start, end, tuple(carriers or ()), tuple(banks or ()), tuple(states or ()))
+
+# Processing time quantiles for the filters, merged from the per-cell sketches
+def sketched(version, start, end, carriers, banks, states):
+    return version.data.sketches.sketch(start, end, carriers, banks, states)
+
+@app.callback([Output('total-packages', 'children'), Output('top-carrier', 'children'),
+               Output('avg-processing', 'children')], FILTERS)
+@metrics.callback('stats')
+@figures.memoize('stats')
+def update_stats(version, *filters):
+    return stats(filtered(version, *filters), sketched(version, *filters))
+
+@app.callback(Output('sankey-graph', 'figure'), FILTERS)
+@metrics.callback('sankey-graph')
+@figures.memoize('sankey-graph')
+def update_sankey(version, *filters):
+    return sankey_figure(filtered(version, *filters))
+
+@app.callback(Output('carrier-bar', 'figure'), FILTERS)
+@metrics.callback('carrier-bar')
+@figures.memoize('carrier-bar')
+def update_carrier_bar(version, *filters):
+    return carrier_bar_figure(filtered(version, *filters))
+
+@app.callback(Output('histogram', 'figure'), FILTERS)
+@metrics.callback('histogram')
+@figures.memoize('histogram')
+def update_histogram(version, *filters):
+    return histogram_figure(filtered(version, *filters), sketched(version, *filters))
+
+# Zooming sends the visible range back here and the chart is redrawn for just that window
+@app.callback(Output('line-chart', 'figure'), FILTERS + [Input('line-chart', 'relayoutData')])
+@metrics.callback('line-chart')
+@figures.memoize('line-chart')
+def update_line_chart(version, start, end, carriers, banks, states, relayout):
+    zoom_start, zoom_end = relayout_range(relayout)
+    return line_chart_figure(version.data.series, start, end, carriers, banks, states, zoom_start, zoom_end)
+
+@app.callback(Output('pie-chart', 'figure'), FILTERS)
+@metrics.callback('pie-chart')
+@figures.memoize('pie-chart')
+def update_pie_chart(version, *filters):
+    return pie_chart_figure(filtered(version, *filters))
+
+@app.callback(Output('heatmap', 'figure'), FILTERS)
+@metrics.callback('heatmap')
+@figures.memoize('heatmap')
+def update_heatmap(version, *filters):
+    return heatmap_figure(filtered(version, *filters))
+
+# Occupancy is physical: only the dates and locker banks apply
+OCCUPANCY_FILTERS = [Input('date-filter', 'start_date'), Input('date-filter', 'end_date'), Input('bank-filter', 'value')]
+
+@app.callback(Output('occupancy-chart', 'figure'), OCCUPANCY_FILTERS)
+@metrics.callback('occupancy-chart')
+@figures.memoize('occupancy-chart')
+def update_occupancy_chart(version, start, end, banks):
+    return occupancy_figure(version.data.occupancy, start, end, banks)
+
+@app.callback(Output('occupancy-stats', 'figure'), OCCUPANCY_FILTERS)
+@metrics.callback('occupancy-stats')
+@figures.memoize('occupancy-stats')
+def update_occupancy_stats(version, start, end, banks):
+    return occupancy_stats_figure(version.data.occupancy, start, end, banks)
+
+# Only the fill values change: the Patch leaves the geometry already in the browser alone
+@app.callback(Output('county-choropleth', 'figure'), FILTERS + [Input('county-scale', 'value')])
+@metrics.callback('county-choropleth')
+def update_county_map(start, end, carriers, banks, states, scale):
+    geometry = load_geometry()
+    if geometry is None:
+        return dash.no_update
+    counts = store.data.counties.counts(geometry.ids, start, end, carriers, banks, states)
+    patch = Patch()
+    patch['data'][0].update(fill(counts, scale))
+    return patch
 
 @app.callback(Output('open-county-map', 'n_clicks'), Input('open-county-map', 'n_clicks'))
 def open_county_map(n_clicks):
     if n_clicks > 0:
-        webbrowser.open_new_tab('http://localhost:8000/countymaplog.html')
+        webbrowser.open_new_tab(DASH_URL + 'files/countymaplog.html')
     return n_clicks
 
 # Auto-open browser
 def open_browser():
-    webbrowser.open_new("http://127.0.0.1:8050/")
-
-# Start local server for countymaplog.html
-class StoppableTCPServer(TCPServer):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._is_shut_down = False
-
-    def serve_forever(self, poll_interval=0.5):
-        while not self._is_shut_down:
-            self.handle_request()
-
-    def shutdown(self):
-        self._is_shut_down = True
-        self.server_close()
-
-def start_local_server():
-    global httpd
-    os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    handler = SimpleHTTPRequestHandler
-    port = 8000
-    while True:
-        try:
-            httpd = StoppableTCPServer(("", port), handler)
-            break
-        except OSError:
-            port += 1
-    httpd.serve_forever()
+    webbrowser.open_new(DASH_URL)
 
 if __name__ == '__main__':
     Timer(1, open_browser).start()
-    server_thread = Thread(target=start_local_server)
-    server_thread.start()
-    try:
-        app.run_server(debug=True)
-    finally:
-        httpd.shutdown()
-        server_thread.join()
+    # Threaded, so a slow download of the CSV never holds up the dashboard's own requests
+    app.run(debug=True, port=DASH_PORT, threaded=True)
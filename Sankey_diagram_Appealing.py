@@ -2,48 +2,35 @@ import pandas as pd
 import plotly.graph_objects as go
 import math
 
+from package_store import load_packages
+from sankey_flow import SankeyFlow
+
 #-----------------------------------------------------------
 # 1) Read the CSV
 #    Replace 'packages.csv' with your actual filename/path
 #-----------------------------------------------------------
-df = pd.read_csv("Cleaned_Package_Data.csv")
+df = load_packages("Cleaned_Package_Data.csv")  # memory-maps Cleaned_Package_Data.feather if it is current
 
 #-----------------------------------------------------------
 # 2) Group "Carriers" into five categories:
 #    Amazon, USPS, UPS, FedEx, and "Other Carriers"
-#-----------------------------------------------------------
-def bucket_carrier(carrier_name):
-    major_carriers = ["Amazon", "USPS", "UPS", "FedEx"]
-    if carrier_name in major_carriers:
-        return carrier_name
-    else:
-        return "Other Carriers"
-
-df["Carrier_Bucket"] = df["Carrier"].apply(bucket_carrier)
-
-#-----------------------------------------------------------
 # 3) Compute total package count + average processing time
-#    for each carrier bucket
+#    for each carrier bucket (one groupby, see sankey_flow.py)
 #-----------------------------------------------------------
-carrier_stats = df.groupby("Carrier_Bucket").agg(
-    Total_Packages = ("Tracking #", "count"),
-    Avg_Processing_Time = ("Processing Time (Hours)", "mean")
-).reset_index()
+MAJOR_CARRIERS = ["Amazon", "USPS", "UPS", "FedEx"]
 
-# Convert any NaN averages to 0 or to "N/A"
-carrier_stats["Avg_Processing_Time"] = carrier_stats["Avg_Processing_Time"].fillna(0)
+carrier_flow = SankeyFlow(df, ["Carrier"], value="Processing Time (Hours)",
+                          keep={"Carrier": MAJOR_CARRIERS}, other="Other Carriers")
 
-# Make a quick dictionary for easy lookup
+# Make a quick dictionary for easy lookup (NaN averages become 0)
 bucket_info = {
-    row["Carrier_Bucket"]: {
-        "count": row["Total_Packages"],
-        "avg": row["Avg_Processing_Time"]
-    }
-    for _, row in carrier_stats.iterrows()
+    label: {"count": int(packages), "avg": 0.0 if pd.isna(avg) else avg}
+    for label, packages, avg in zip(carrier_flow.nodes["label"], carrier_flow.nodes["packages"],
+                                    carrier_flow.nodes["mean"])
 }
 
 # For convenience, define the 5 final labels we expect:
-ALL_BUCKETS = ["Amazon", "USPS", "UPS", "FedEx", "Other Carriers"]
+ALL_BUCKETS = MAJOR_CARRIERS + ["Other Carriers"]
 
 # If a bucket is missing from the data, set it to 0
 for b in ALL_BUCKETS:
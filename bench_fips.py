@@ -0,0 +1,64 @@
+# Per-row vs batched County FIPS lookup on Cleaned_Package_Data_County.csv scaled up.
+#   python bench_fips.py --scales 1 10 100
+
+import argparse
+import time
+
+import pandas as pd
+
+from fillCountyFIPS import add_fips, add_fips_offline, get_fips, input_file
+from offline_resolver import OfflineResolver
+
+
+# The original fillCountyFIPS.py: df.apply(axis=1) with one addfips call per row
+def per_row(df):
+    df["County FIPS"] = df.apply(lambda row: get_fips(row["Origin County"], row["Origin State"]), axis=1)
+    return df
+
+
+def time_it(function, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = function(frame)
+        best = min(best, time.perf_counter() - start)
+    return best, result["County FIPS"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=input_file)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.input)
+    resolver = OfflineResolver()
+    methods = {
+        "per-row apply": per_row,
+        "batched addfips": add_fips,
+        "offline gazetteer": lambda frame: add_fips_offline(frame, resolver),
+    }
+
+    rows = []
+    for scale in args.scales:
+        df = pd.concat([base] * scale, ignore_index=True)
+        timings = {}
+        for name, function in methods.items():
+            # The per-row version takes minutes at 100x, once is enough
+            repeat = 1 if name == "per-row apply" and scale >= 10 else args.repeat
+            timings[name], fips = time_it(function, df, repeat)
+            if name == "per-row apply":
+                expected = fips
+            elif name == "batched addfips" and not fips.equals(expected):
+                print(f"warning: batched result differs from per-row result at {scale}x")
+        rows.append({"scale": f"{scale}x", "rows": len(df), **{name: f"{seconds:.3f} s" for name, seconds in timings.items()},
+                     "speedup": f"{timings['per-row apply'] / timings['batched addfips']:.0f}x"})
+
+    print()
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
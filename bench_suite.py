@@ -0,0 +1,192 @@
+# End-to-end benchmark of every pipeline stage and dashboard figure on synthetic data from generate_data.py,
+# with regression thresholds from bench_thresholds.json.
+#   python bench_suite.py --rows 10000 100000
+#   python bench_suite.py --rows 1000000 --repeat 1 --lookup-rows 2000
+#   python bench_suite.py --rows 10000 100000 --repeat 7 --write-thresholds    # recalibrate on a new machine
+#
+# Every stage is timed --repeat times and its median reported, so one slow run on a busy machine does not
+# count. Each stage's threshold is base + per_million_rows x (millions of rows it processed), fitted from
+# medians with HEADROOM to spare; the run exits with status 1 if any stage's median is slower. The county map
+# is only measured when the county topology exists (build_topojson.py); without it the figure is a
+# placeholder and is reported as not measured. The origin lookup runs against the local Shippo stub (shippo_stub_server.py)
+# and the county / FIPS stages against the bundled gazetteer, so nothing leaves the machine.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from cleanPackageData import clean_packages
+from county_choropleth import load_geometry
+from dashboard_figures import build_dashboard_data, occupancy_stats_figure, select, stats
+from export_snapshots import CHARTS, Report
+from fillCountyData import fill_counties_offline
+from fillCountyFIPS import add_fips, add_fips_offline
+from generate_data import MailroomProfile, generate
+from offline_resolver import OfflineResolver
+from package_store import DATE_COLUMNS, parse_dates, read_columnar, read_text_csv, to_columnar, write_columnar
+from shippo_lookup import OriginLookup, enrich_origins
+from shippo_stub_server import start_stub_server
+
+THRESHOLDS_FILE = "bench_thresholds.json"
+# --write-thresholds allows this many times the median time, and at least MIN_BASE seconds on top of the
+# median, which stages of a few milliseconds can exceed on a slower machine from scheduling noise alone
+HEADROOM = 5.0
+MIN_BASE = 0.1
+
+
+# Median seconds of `repeat` runs, and the last result
+def timed(function, repeat):
+    seconds, result = [], None
+    for _ in range(repeat):
+        # The stages print their own progress, which would bury the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds), result
+
+
+def lookup_origins(raw, base_url):
+    frame = raw[["Carrier", "Tracking #"]].copy()
+    with OriginLookup("test", base_url=base_url, max_workers=16, rate=100000.0, backoff=0.01) as lookup:
+        return enrich_origins(frame, lookup)
+
+
+# (stage, seconds, rows it processed) for every stage at one size; seconds is None for stages not measured
+def run(profile, rows, seed, directory, repeat, lookup_rows, base_url):
+    raw_path = os.path.join(directory, "packages.csv")
+    cleaned_path = os.path.join(directory, "Cleaned_Package_Data_County_FIPS.csv")
+    feather_path = os.path.join(directory, "packages.feather")
+    results = []
+
+    def stage(name, function, processed=rows, times=repeat):
+        seconds, result = timed(function, times)
+        results.append((name, seconds, processed))
+        return result
+
+    stage("generate", lambda: generate(profile, rows, seed, raw_path, cleaned_path), times=1)
+
+    # Ingest and clean the raw export
+    raw = stage("read raw csv", lambda: pd.read_csv(raw_path))
+    stage("parse dates", lambda: [parse_dates(raw[column]) for column in DATE_COLUMNS])
+    stage("clean", lambda: clean_packages(raw))
+
+    # Enrichment, against the stub API and the offline gazetteer
+    sample = raw.sample(min(lookup_rows, rows), random_state=seed)
+    stage("origin lookup (stub)", lambda: lookup_origins(sample, base_url), processed=len(sample), times=1)
+    cleaned = read_text_csv(cleaned_path)
+    resolver = OfflineResolver()
+    stage("county (offline)", lambda: fill_counties_offline(cleaned.assign(**{"Origin County": pd.NA}), resolver))
+    stage("fips (offline)", lambda: add_fips_offline(cleaned.copy(), resolver))
+    stage("fips (addfips)", lambda: add_fips(cleaned.copy()))
+
+    # Load for the dashboard
+    typed = stage("load cleaned csv", lambda: to_columnar(read_text_csv(cleaned_path)))
+    stage("write feather", lambda: write_columnar(typed, feather_path))
+    stage("read feather", lambda: read_columnar(feather_path))
+    data = stage("dashboard data", lambda: build_dashboard_data(typed))
+
+    # Every figure, for the whole range and for one month of the biggest carrier
+    top_carrier = str(data.df["Carrier"].value_counts().index[0])
+    month_end = min(data.first_day + pd.Timedelta(days=30), data.last_day)
+    reports = {"all": Report(data.first_day, data.last_day),
+               "filtered": Report(data.first_day, month_end, carriers=[top_carrier])}
+    geometry = load_geometry()
+    for label, report in reports.items():
+        for chart, build in CHARTS.items():
+            if chart == "county_map" and geometry is None:
+                results.append((f"{chart} figure ({label})", None, rows))
+                continue
+            stage(f"{chart} figure ({label})", lambda build=build, report=report: build(data, report))
+        stage(f"stats ({label})", lambda report=report: stats(select(data, *report.filters),
+                                                              data.sketches.sketch(*report.filters)))
+        stage(f"occupancy_stats figure ({label})",
+              lambda report=report: occupancy_stats_figure(data.occupancy, report.start, report.end, report.banks))
+    return results
+
+
+def limit(threshold, processed):
+    return threshold["base"] + threshold["per_million_rows"] * processed / 1e6
+
+
+# Thresholds a run on this machine passes with HEADROOM to spare: the base from the smallest run's median,
+# the per-row part from the biggest one's
+def fitted_thresholds(results):
+    thresholds = {}
+    measured = pd.DataFrame(results, columns=["rows", "stage", "seconds", "processed"]).dropna(subset=["seconds"])
+    for stage, runs in measured.groupby("stage", sort=False):
+        smallest, biggest = runs.loc[runs["processed"].idxmin()], runs.loc[runs["processed"].idxmax()]
+        median = smallest["seconds"]
+        thresholds[stage] = {"base": round(median + max(MIN_BASE, median * (HEADROOM - 1)), 3),
+                             "per_million_rows": round(biggest["seconds"] * HEADROOM / biggest["processed"] * 1e6, 3)}
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per stage; the median is reported")
+    parser.add_argument("--lookup-rows", type=int, default=500, help="Rows sent to the stub Shippo API")
+    parser.add_argument("--profile", default="Cleaned_Package_Data_County_FIPS.csv")
+    parser.add_argument("--thresholds", default=THRESHOLDS_FILE)
+    parser.add_argument("--write-thresholds", action="store_true",
+                        help=f"Write thresholds of {HEADROOM:g}x this run's median times")
+    args = parser.parse_args()
+
+    profile = MailroomProfile(args.profile)
+    server, base_url = start_stub_server()
+    results = []
+    try:
+        for rows in args.rows:
+            print(f"Benchmarking {rows:,} rows...")
+            with tempfile.TemporaryDirectory() as directory:
+                results.extend((rows, *result) for result in
+                               run(profile, rows, args.seed, directory, args.repeat, args.lookup_rows, base_url))
+    finally:
+        server.shutdown()
+
+    if args.write_thresholds:
+        fitted = fitted_thresholds(results)
+        with open(args.thresholds, "w", encoding="utf-8") as thresholds_file:
+            json.dump(fitted, thresholds_file, indent=2)
+            thresholds_file.write("\n")
+        print(f"Wrote thresholds for {len(fitted)} stages to {args.thresholds}")
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as thresholds_file:
+            thresholds = json.load(thresholds_file)
+
+    table = []
+    for rows, stage, seconds, processed in results:
+        if seconds is None:
+            table.append({"rows": rows, "stage": stage, "seconds": "-", "rows/s": "-", "limit": "-",
+                          "status": "not measured (no county topology)"})
+            continue
+        row = {"rows": rows, "stage": stage, "seconds": f"{seconds:.3f}",
+               "rows/s": f"{processed / seconds:,.0f}" if seconds > 0 else "-"}
+        if stage in thresholds:
+            allowed = limit(thresholds[stage], processed)
+            row["limit"] = f"{allowed:.3f}"
+            row["status"] = "REGRESSION" if seconds > allowed else "ok"
+        table.append(row)
+    table = pd.DataFrame(table)
+    print()
+    print(table.to_string(index=False))
+
+    regressions = table[table["status"] == "REGRESSION"] if "status" in table.columns else table.iloc[:0]
+    if len(regressions):
+        print(f"\n{len(regressions)} stage(s) slower than their threshold in {args.thresholds}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Throughput benchmark for the origin lookup in tracking.py, run against the local stub server.
+#   python bench_tracking.py --rows 2000 --latency 0.05 --workers 16
+
+import argparse
+import time
+
+import pandas as pd
+import requests
+
+from shippo_lookup import OriginLookup, enrich_origins, normalize_keys, parse_address, ORIGIN_COLUMNS, SUPPORTED_CARRIERS
+from shippo_stub_server import start_stub_server
+
+
+# Build a frame shaped like packages.csv with `rows` distinct tracking numbers
+def make_frame(rows):
+    carriers = ['USPS', 'UPS', 'FedEx', 'Amazon']
+    return pd.DataFrame({
+        'Carrier': [carriers[i % len(carriers)] for i in range(rows)],
+        'Tracking #': [f"9400{i:018d}_" for i in range(rows)],
+    })
+
+
+# The original tracking.py loop: one requests.get per row, no shared session, df.at writes
+def run_sequential(df, base_url):
+    df = df.copy()
+    for column in ORIGIN_COLUMNS:
+        df[column] = ''
+    for index, row in df.iterrows():
+        carrier = row['Carrier'].strip().lower()
+        tracking_number = row['Tracking #'].strip().rstrip('_')
+        if carrier in SUPPORTED_CARRIERS:
+            response = requests.get(f"{base_url}/{carrier}/{tracking_number}", headers={"Authorization": "ShippoToken test"})
+            address = parse_address(response.json()) if response.ok else None
+            for column, value in zip(ORIGIN_COLUMNS, address or ('', '', '', '')):
+                df.at[index, column] = value
+    return df
+
+
+def run_pooled(df, base_url, workers, rate):
+    df = df.copy()
+    with OriginLookup('test', base_url=base_url, max_workers=workers, rate=rate, backoff=0.01) as lookup:
+        enrich_origins(df, lookup)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated API latency in seconds")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--fail-every', type=int, default=50, help="Every Nth stub response is a 429/503")
+    parser.add_argument('--skip-sequential', action='store_true')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, fail_every=args.fail_every)
+    df = make_frame(args.rows)
+    eligible = int(normalize_keys(df)[0].isin(SUPPORTED_CARRIERS).sum())
+
+    results = {}
+    if not args.skip_sequential:
+        start = time.perf_counter()
+        sequential = run_sequential(df, base_url)
+        results['sequential'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pooled = run_pooled(df, base_url, args.workers, args.rate)
+    results['pooled'] = time.perf_counter() - start
+    server.shutdown()
+
+    print()
+    print(f"{args.rows} rows, {eligible} lookups, {args.latency * 1000:.0f} ms simulated latency")
+    for name, seconds in results.items():
+        print(f"{name:>10}: {seconds:8.2f} s  {eligible / seconds:8.1f} lookups/s")
+    if 'sequential' in results:
+        print(f"   speedup: {results['sequential'] / results['pooled']:.1f}x")
+        # The sequential loop does not retry, so only compare rows it managed to fill
+        filled = sequential['Origin City'] != ''
+        mismatched = (sequential.loc[filled, ORIGIN_COLUMNS] != pooled.loc[filled, ORIGIN_COLUMNS]).any(axis=1).sum()
+        print(f"rows differing from sequential run: {mismatched}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# pip install pandas addfips zipcodes
+#
+# Builds us_zip_county_gazetteer.csv.gz, the offline ZIP / city -> county / FIPS table used by
+# offline_resolver.py. Only needs to be re-run when the source data changes.
+#
+#   python build_gazetteer.py                      # ZIP + city rows from the `zipcodes` package
+#   python build_gazetteer.py --census-places national_place_by_county2020.txt
+#                                                  # also add Census place-by-county rows
+
+import argparse
+
+import addfips
+import pandas as pd
+
+OUTPUT_FILE = "us_zip_county_gazetteer.csv.gz"
+COLUMNS = ["zip", "city", "state", "county", "fips"]
+
+# Legal/statistical area suffixes on Census place names ("Worcester city", "Shrewsbury CDP")
+PLACE_SUFFIXES = r"\s+(city|town|village|borough|CDP|municipality|township|plantation|comunidad|zona urbana)$"
+
+
+# Same naming as fillCountyData.py: "Worcester County" is stored as "Worcester"
+def clean_county_name(county):
+    return county.str.replace(r"\s+County$", "", regex=True).str.strip()
+
+
+def zipcode_rows():
+    import zipcodes
+
+    rows = []
+    for record in zipcodes.list_all():
+        if not record["county"]:
+            continue
+        # The primary city plus the other names USPS accepts for the ZIP
+        for city in [record["city"]] + list(record["acceptable_cities"]):
+            rows.append((record["zip_code"], city, record["state"], record["county"]))
+    return pd.DataFrame(rows, columns=["zip", "city", "state", "county"])
+
+
+def census_place_rows(path):
+    places = pd.read_csv(path, sep="|", dtype=str, encoding="latin-1")
+    return pd.DataFrame({
+        "zip": "",
+        "city": places["PLACENAME"].str.replace(PLACE_SUFFIXES, "", regex=True),
+        "state": places["STATE"],
+        "county": places["COUNTYNAME"],
+        "fips": places["STATEFP"] + places["COUNTYFP"],
+    })
+
+
+def build(census_places=None):
+    af = addfips.AddFIPS()
+    table = zipcode_rows()
+    # addfips knows the official county names, so resolve each distinct county once
+    counties = table[["county", "state"]].drop_duplicates()
+    counties["fips"] = [af.get_county_fips(county, state=state) for county, state in counties.itertuples(index=False)]
+    table = table.merge(counties, on=["county", "state"], how="left")
+    if census_places:
+        table = pd.concat([table, census_place_rows(census_places)], ignore_index=True)
+
+    table = table.dropna(subset=["fips"])
+    table["county"] = clean_county_name(table["county"])
+    table = table[COLUMNS].drop_duplicates().sort_values(["state", "city", "zip"])
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline ZIP/city -> county gazetteer.")
+    parser.add_argument("--census-places", help="Census national_place_by_county file (pipe separated)")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args()
+
+    table = build(args.census_places)
+    table.to_csv(args.output, index=False, compression="gzip")
+    print(f"Wrote {len(table)} rows ({table['zip'].replace('', pd.NA).nunique()} ZIP codes, "
+          f"{table['fips'].nunique()} counties) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
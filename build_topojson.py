@@ -0,0 +1,488 @@
+# No dependencies beyond the standard library
+#
+# Builds the county map topology the D3 pages and the Dash choropleth load, so they no longer fetch
+# counties-albers-10m.json from jsdelivr on every page load. The result, counties-albers-simplified.json, is
+# committed; rebuild it only to change the simplification or the source.
+#
+#   python build_topojson.py                        # download us-atlas once, write the simplified copy
+#   python build_topojson.py --source counties-albers-10m.json --min-area 2 --quantization 10000
+#   pip install plotly-geo && python build_topojson.py --shapefile plotly-geo
+#                                                   # from the Census county shapefile plotly-geo ships
+#
+# The source is us-atlas' counties-albers-10m.json, already projected to the 975 x 610 frame the pages draw
+# in. Each arc is simplified (Visvalingam: points whose triangle with their neighbours is smaller than
+# --min-area square pixels are dropped) and the coordinates are re-quantized to a coarser grid. Arcs are
+# shared between neighbouring counties and their end points are never removed, so borders still meet.
+#
+# Without access to the CDN, --shapefile builds the same topology from a Census cartographic boundary county
+# shapefile (cb_*_us_county_*.shp, the files us-atlas itself is made from): counties are projected with
+# d3's geoAlbersUsa at us-atlas' scale and translation, their shared borders are cut into arcs, and the
+# states and the nation are dissolved from the counties so their outlines use the very same arcs.
+#
+# Outputs:
+#   counties-albers-10m.json          the untouched us-atlas source, vendored next to the pages
+#   counties-albers-simplified.json   what the pages load (they fall back to the CDN when it is missing)
+
+import argparse
+import glob
+import heapq
+import json
+import math
+import os
+import struct
+import urllib.request
+
+SOURCE_URL = "https://cdn.jsdelivr.net/npm/us-atlas@3/counties-albers-10m.json"
+VENDORED_FILE = "counties-albers-10m.json"
+SIMPLIFIED_FILE = "counties-albers-simplified.json"
+
+# One square pixel of the 975 x 610 frame; about the smallest detail visible at the pages' size
+MIN_AREA = 1.0
+QUANTIZATION = 10000
+
+
+def load_source(source):
+    if os.path.exists(source):
+        with open(source, encoding="utf-8") as topology_file:
+            return json.load(topology_file)
+    print(f"Downloading {source}")
+    with urllib.request.urlopen(source, timeout=60) as response:
+        topology = json.load(response)
+    with open(VENDORED_FILE, "w", encoding="utf-8") as vendored:
+        json.dump(topology, vendored, separators=(",", ":"))
+    print(f"Vendored it as {VENDORED_FILE}")
+    return topology
+
+
+# d3.geoConicEqualArea().parallels(parallels).rotate([rotate, 0]).center(center).scale(scale).translate(translate)
+def conic_equal_area(parallels, rotate, center, scale, translate):
+    sin0 = math.sin(math.radians(parallels[0]))
+    n = (sin0 + math.sin(math.radians(parallels[1]))) / 2
+    c = 1 + sin0 * (2 * n - sin0)
+    r0 = math.sqrt(c) / n
+
+    def raw(lam, phi):
+        r = math.sqrt(c - 2 * n * math.sin(phi)) / n
+        return r * math.sin(lam * n), r0 - r * math.cos(lam * n)
+
+    cx, cy = raw(math.radians(center[0]), math.radians(center[1]))
+    dx, dy = translate[0] - scale * cx, translate[1] + scale * cy
+
+    def project(lon, lat):
+        lam = (math.radians(lon + rotate) + math.pi) % (2 * math.pi) - math.pi
+        x, y = raw(lam, math.radians(lat))
+        return dx + scale * x, dy - scale * y
+    return project
+
+
+# d3.geoAlbersUsa().scale(1300).translate([487.5, 305]), the projection of us-atlas' albers files: the lower 48
+# plus Alaska and Hawaii moved into insets, each clipped to its extent (which cuts off the western Aleutians).
+# Returns (projection, extent) for a state FIPS code, None for territories.
+def albers_usa(scale=1300, translate=(487.5, 305)):
+    x, y = translate
+    lower48 = (conic_equal_area((29.5, 45.5), 96, (-0.6, 38.7), scale, (x, y)),
+               (x - 0.455 * scale, y - 0.238 * scale, x + 0.455 * scale, y + 0.238 * scale))
+    insets = {"02": (conic_equal_area((55, 65), 154, (-2, 58.5), scale * 0.35,
+                                      (x - 0.307 * scale, y + 0.201 * scale)),
+                     (x - 0.425 * scale, y + 0.120 * scale, x - 0.214 * scale, y + 0.234 * scale)),
+              "15": (conic_equal_area((8, 18), 157, (-3, 19.9), scale, (x - 0.205 * scale, y + 0.212 * scale)),
+                     (x - 0.214 * scale, y + 0.166 * scale, x - 0.115 * scale, y + 0.234 * scale))}
+    return lambda state: insets.get(state, lower48 if int(state) <= 56 else None)
+
+
+# Sutherland-Hodgman: the part of a closed ring inside the (x0, y0, x1, y1) rectangle, closed again
+def clip_ring(ring, extent):
+    x0, y0, x1, y1 = extent
+    edges = [(lambda p: p[0] >= x0, 0, x0), (lambda p: p[0] <= x1, 0, x1),
+             (lambda p: p[1] >= y0, 1, y0), (lambda p: p[1] <= y1, 1, y1)]
+    points = ring[:-1]
+    for keep, axis, bound in edges:
+        clipped = []
+        for previous, point in zip(points[-1:] + points[:-1], points):
+            if keep(point) != keep(previous):
+                t = (bound - previous[axis]) / (point[axis] - previous[axis])
+                crossing = [previous[0] + t * (point[0] - previous[0]), previous[1] + t * (point[1] - previous[1])]
+                crossing[axis] = bound
+                clipped.append(tuple(crossing))
+            if keep(point):
+                clipped.append(point)
+        points = clipped
+        if not points:
+            return []
+    return points + points[:1]
+
+
+def read_dbf(path):
+    with open(path, "rb") as dbf:
+        data = dbf.read()
+    count, header_size, record_size = struct.unpack_from("<IHH", data, 4)
+    fields, offset = [], 32
+    while data[offset] != 0x0D:
+        fields.append((data[offset:offset + 11].split(b"\0")[0].decode("ascii"), data[offset + 16]))
+        offset += 32
+    records = []
+    for i in range(count):
+        # Each record starts with a deletion flag
+        position = header_size + i * record_size + 1
+        record = {}
+        for name, size in fields:
+            raw = data[position:position + size]
+            try:
+                record[name] = raw.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                record[name] = raw.decode("latin-1").strip()
+            position += size
+        records.append(record)
+    return records
+
+
+# The rings of every polygon record of a .shp file, as (lon, lat) lists; records of other shape types get none
+def read_shp_rings(path):
+    with open(path, "rb") as shp:
+        data = shp.read()
+    shapes, offset = [], 100
+    while offset < len(data):
+        length = struct.unpack_from(">i", data, offset + 4)[0] * 2
+        content = offset + 8
+        rings = []
+        if struct.unpack_from("<i", data, content)[0] == 5:
+            parts, points = struct.unpack_from("<2i", data, content + 36)
+            bounds = list(struct.unpack_from(f"<{parts}i", data, content + 44)) + [points]
+            coordinates = struct.unpack_from(f"<{2 * points}d", data, content + 44 + 4 * parts)
+            rings = [list(zip(coordinates[2 * a:2 * b:2], coordinates[2 * a + 1:2 * b:2]))
+                     for a, b in zip(bounds, bounds[1:])]
+        shapes.append(rings)
+        offset = content + length
+    return shapes
+
+
+# The county shapefile in the plotly-geo package
+def plotly_geo_shapefile():
+    try:
+        import _plotly_geo
+    except ImportError:
+        raise SystemExit("plotly-geo is not installed: pip install plotly-geo, or pass the .shp path")
+    directory = os.path.join(os.path.dirname(_plotly_geo.__file__), "package_data")
+    return sorted(glob.glob(os.path.join(directory, "cb_*_us_county_*.shp")))[-1]
+
+
+def ring_area(ring):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:])) / 2
+
+
+def inside(point, ring):
+    x, y = point
+    crossings = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+            crossings = not crossings
+    return crossings
+
+
+# Polygons (lists of ring indices, exterior first) from rings flagged exterior or hole; a hole goes to the
+# smallest exterior around it
+def group_rings(rings, exterior):
+    polygons = {i: [i] for i, outer in enumerate(exterior) if outer}
+    for i, outer in enumerate(exterior):
+        if outer:
+            continue
+        (x0, y0), (x1, y1) = rings[i][0], rings[i][1]
+        probe = ((x0 + x1) / 2, (y0 + y1) / 2)
+        around = [j for j in polygons if inside(probe, rings[j])]
+        if around:
+            polygons[min(around, key=lambda j: abs(ring_area(rings[j])))].append(i)
+    return list(polygons.values())
+
+
+# Cuts closed rings of points into arcs, as topojson does: a point whose neighbours differ between the rings
+# through it is a junction, and arcs run from junction to junction, so a border two rings share is one arc
+# that one of them references reversed (~i). Returns the arcs and each ring's references.
+def cut_arcs(rings):
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        for before, point, after in zip([ring[-2]] + ring[:-2], ring[:-1], ring[1:]):
+            pair = (before, after) if before <= after else (after, before)
+            if neighbours.setdefault(point, pair) != pair:
+                junctions.add(point)
+
+    arcs, index, references = [], {}, []
+
+    def reference(arc):
+        key = tuple(arc)
+        if key in index:
+            return index[key]
+        if key[::-1] in index:
+            return ~index[key[::-1]]
+        index[key] = len(arcs)
+        arcs.append([list(point) for point in arc])
+        return index[key]
+
+    for ring in rings:
+        points = ring[:-1]
+        cuts = [i for i, point in enumerate(points) if point in junctions]
+        if not cuts:
+            # A ring no other ring touches (an island, or an enclave and the hole around it): one closed arc,
+            # started at its smallest point so both sides find the same one
+            first = points.index(min(points))
+            references.append([reference(points[first:] + points[:first + 1])])
+            continue
+        points = points[cuts[0]:] + points[:cuts[0] + 1]
+        cuts = [i - cuts[0] for i in cuts] + [len(points) - 1]
+        references.append([reference(points[a:b + 1]) for a, b in zip(cuts, cuts[1:])])
+    return arcs, references
+
+
+def _ends(arcs, reference):
+    arc = arcs[reference] if reference >= 0 else arcs[~reference][::-1]
+    return tuple(arc[0]), tuple(arc[-1])
+
+
+def ring_points(arcs, references):
+    points = []
+    for reference in references:
+        arc = arcs[reference] if reference >= 0 else arcs[~reference][::-1]
+        points.extend(arc[1:] if points else arc)
+    return points
+
+
+# The outline of a group of polygons (lists of ring references): borders two of them share cancel out, and
+# what is left is stitched back into rings at the arcs' end points
+def dissolve(arcs, polygons):
+    outline = set()
+    for rings in polygons:
+        for references in rings:
+            for reference in references:
+                if ~reference in outline:
+                    outline.remove(~reference)
+                else:
+                    outline.add(reference)
+    starts = {}
+    for reference in sorted(outline):
+        starts.setdefault(_ends(arcs, reference)[0], []).append(reference)
+    rings = []
+    while starts:
+        start = next(iter(starts))
+        ring, point = [], start
+        while point in starts:
+            reference = starts[point].pop()
+            if not starts[point]:
+                del starts[point]
+            ring.append(reference)
+            point = _ends(arcs, reference)[1]
+            if point == start:
+                break
+        rings.append(ring)
+    points = [ring_points(arcs, ring) for ring in rings]
+    # Stitched arcs keep the counties' direction, in which exteriors have a positive area once projected
+    grouped = group_rings(points, [ring_area(ring) > 0 for ring in points])
+    return [[rings[i] for i in polygon] for polygon in grouped]
+
+
+def polygon_geometry(polygons, **fields):
+    if len(polygons) == 1:
+        return {"type": "Polygon", "arcs": polygons[0], **fields}
+    return {"type": "MultiPolygon", "arcs": polygons, **fields}
+
+
+# A topology like us-atlas' counties-albers-10m.json (counties, states and nation objects, ids are FIPS codes)
+# from a Census county shapefile, before simplification
+def topology_from_shapefile(path):
+    records = read_dbf(os.path.splitext(path)[0] + ".dbf")
+    state_files = glob.glob(os.path.join(os.path.dirname(path), "cb_*_us_state_*.dbf"))
+    state_names = {record["STATEFP"]: record["NAME"] for record in read_dbf(state_files[0])} if state_files else {}
+    projection_for = albers_usa()
+
+    counties, rings, exterior = [], [], []
+    for record, shape in zip(records, read_shp_rings(path)):
+        projection = projection_for(record["STATEFP"])
+        if projection is None or not shape:
+            continue
+        project, extent = projection
+        first = len(rings)
+        for ring in shape:
+            points = []
+            for x, y in clip_ring([project(lon, lat) for lon, lat in ring], extent):
+                point = (round(x, 6), round(y, 6))
+                if not points or point != points[-1]:
+                    points.append(point)
+            # Rings outside the extent are clipped down to nothing, or to a sliver along its edge
+            if len(points) >= 4 and abs(ring_area(points)) > 1e-6:
+                rings.append(points)
+                # Shapefile exteriors run clockwise in lon / lat
+                exterior.append(ring_area(ring) < 0)
+        counties.append((record, range(first, len(rings))))
+
+    arcs, references = cut_arcs(rings)
+    geometries, by_state = [], {}
+    for record, ring_ids in counties:
+        ring_ids = list(ring_ids)
+        grouped = group_rings([rings[i] for i in ring_ids], [exterior[i] for i in ring_ids])
+        polygons = [[references[ring_ids[i]] for i in polygon] for polygon in grouped]
+        geometries.append(polygon_geometry(polygons, id=record["GEOID"], properties={"name": record["NAME"]}))
+        by_state.setdefault(record["STATEFP"], []).extend(polygons)
+    geometries.sort(key=lambda geometry: geometry["id"])
+
+    states = [polygon_geometry(dissolve(arcs, polygons), id=state,
+                               properties={"name": state_names.get(state, "")})
+              for state, polygons in sorted(by_state.items())]
+    nation = polygon_geometry(dissolve(arcs, [polygon for polygons in by_state.values() for polygon in polygons]))
+    return {"type": "Topology",
+            "objects": {"counties": {"type": "GeometryCollection", "geometries": geometries},
+                        "states": {"type": "GeometryCollection", "geometries": states},
+                        "nation": {"type": "GeometryCollection", "geometries": [nation]}},
+            "arcs": arcs}
+
+
+# Arcs as lists of absolute [x, y], undoing the delta encoding of a quantized topology
+def decode_arcs(topology):
+    transform = topology.get("transform")
+    if transform is None:
+        return [[list(point[:2]) for point in arc] for arc in topology["arcs"]]
+    (sx, sy), (tx, ty) = transform["scale"], transform["translate"]
+    arcs = []
+    for arc in topology["arcs"]:
+        x = y = 0
+        points = []
+        for dx, dy in (point[:2] for point in arc):
+            x += dx
+            y += dy
+            points.append([x * sx + tx, y * sy + ty])
+        arcs.append(points)
+    return arcs
+
+
+def triangle_area(a, b, c):
+    return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2
+
+
+# Visvalingam-Whyatt: repeatedly drop the interior point with the smallest triangle until every remaining
+# one is at least min_area. A point's area never drops below the last one removed, as in topojson-simplify.
+def simplify_arc(points, min_area):
+    closed = len(points) > 3 and points[0] == points[-1]
+    # A closed ring (an island drawn as one arc) needs 4 points to stay a ring
+    keep_at_least = 4 if closed else 2
+    if len(points) <= keep_at_least:
+        return points
+
+    previous = list(range(-1, len(points) - 1))
+    following = list(range(1, len(points) + 1))
+    areas = [float("inf")] * len(points)
+    heap = []
+    for i in range(1, len(points) - 1):
+        areas[i] = triangle_area(points[i - 1], points[i], points[i + 1])
+        heap.append((areas[i], i))
+    heapq.heapify(heap)
+
+    remaining = len(points)
+    removed = [False] * len(points)
+    last_area = 0.0
+    while heap and remaining > keep_at_least:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue
+        if area >= min_area:
+            break
+        last_area = max(last_area, area)
+        removed[i] = True
+        remaining -= 1
+        before, after = previous[i], following[i]
+        following[before], previous[after] = after, before
+        for j in (before, after):
+            if 0 < j < len(points) - 1:
+                areas[j] = max(last_area, triangle_area(points[previous[j]], points[j], points[following[j]]))
+                heapq.heappush(heap, (areas[j], j))
+    return [point for point, gone in zip(points, removed) if not gone]
+
+
+def bounding_box(arcs):
+    xs = [point[0] for arc in arcs for point in arc]
+    ys = [point[1] for arc in arcs for point in arc]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+# Snaps absolute points to a quantization x quantization grid over bbox and delta-encodes them
+def quantize_arcs(arcs, bbox, quantization):
+    x0, y0, x1, y1 = bbox
+    kx = (x1 - x0) / (quantization - 1) or 1
+    ky = (y1 - y0) / (quantization - 1) or 1
+    encoded = []
+    for arc in arcs:
+        grid = []
+        for x, y in arc:
+            point = (round((x - x0) / kx), round((y - y0) / ky))
+            # Points that land in the same cell say nothing more
+            if not grid or point != grid[-1]:
+                grid.append(point)
+        if len(grid) == 1:
+            # The whole arc fell into one cell; keep it as a zero-length arc so references stay valid
+            grid.append(grid[0])
+        deltas = [list(grid[0])]
+        deltas.extend([x - px, y - py] for (px, py), (x, y) in zip(grid, grid[1:]))
+        encoded.append(deltas)
+    return encoded, {"scale": [kx, ky], "translate": [x0, y0]}
+
+
+# Every ring (list of arc references) of the polygons of a topology
+def topology_rings(topology):
+    for collection in topology["objects"].values():
+        for geometry in collection.get("geometries", [collection]):
+            if geometry.get("type") == "Polygon":
+                yield from geometry["arcs"]
+            elif geometry.get("type") == "MultiPolygon":
+                for rings in geometry["arcs"]:
+                    yield from rings
+
+
+def simplify(topology, min_area=MIN_AREA, quantization=QUANTIZATION):
+    topology = json.loads(json.dumps(topology))
+    original = decode_arcs(topology)
+    arcs = [simplify_arc(arc, min_area) for arc in original]
+    # Counties smaller than a few square pixels (Virginia's independent cities) would collapse to a line;
+    # a ring that simplification shrinks to less than half its area keeps its arcs whole
+    for references in topology_rings(topology):
+        if abs(ring_area(ring_points(arcs, references))) < abs(ring_area(ring_points(original, references))) / 2:
+            for reference in references:
+                index = reference if reference >= 0 else ~reference
+                arcs[index] = original[index]
+    bbox = topology.get("bbox") or bounding_box(arcs)
+    topology["arcs"], topology["transform"] = quantize_arcs(arcs, bbox, quantization)
+    topology["bbox"] = bbox
+    return topology
+
+
+def write_topology(topology, path):
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(topology, output, separators=(",", ":"))
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor and simplify the us-atlas county topology for the maps.")
+    parser.add_argument("--source", default=VENDORED_FILE if os.path.exists(VENDORED_FILE) else SOURCE_URL,
+                        help="counties-albers-10m.json path or URL (downloaded and vendored when a URL)")
+    parser.add_argument("--shapefile", metavar="SHP",
+                        help="Build from a Census county shapefile instead of us-atlas "
+                             "('plotly-geo' for the one that package ships)")
+    parser.add_argument("--output", default=SIMPLIFIED_FILE)
+    parser.add_argument("--min-area", type=float, default=MIN_AREA,
+                        help="Drop points whose triangle is smaller than this many square pixels")
+    parser.add_argument("--quantization", type=int, default=QUANTIZATION)
+    args = parser.parse_args()
+
+    if args.shapefile:
+        path = plotly_geo_shapefile() if args.shapefile == "plotly-geo" else args.shapefile
+        print(f"Projecting {path}")
+        topology = topology_from_shapefile(path)
+    else:
+        topology = load_source(args.source)
+    source_size = len(json.dumps(topology, separators=(",", ":")))
+    points = sum(len(arc) for arc in topology["arcs"])
+
+    simplified = simplify(topology, args.min_area, args.quantization)
+    size = write_topology(simplified, args.output)
+    print(f"Wrote {args.output}: {sum(len(arc) for arc in simplified['arcs'])} of {points} points, "
+          f"{size / 1024:.0f} KB (source {source_size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Crash-safe progress saving for long enrichment runs.
+#
+# Instead of rewriting the whole CSV after every filled row, each result is appended to a small
+# journal file (one JSON object per line) that is replayed on restart. The CSV itself is only rewritten
+# in batches, atomically through a temp file + rename so a crash can never leave a half-written CSV behind.
+
+import json
+import os
+import tempfile
+
+
+# Write a DataFrame to `path` so readers only ever see the old file or the complete new one
+def atomic_write_csv(df, path, **to_csv_kwargs):
+    to_csv_kwargs.setdefault('index', False)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as temp_file:
+            df.to_csv(temp_file, **to_csv_kwargs)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# Append-only log of JSON records. The first line describes what the records apply to so a journal
+# left over from a different input is not replayed by mistake.
+class ProgressJournal:
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self._file = None
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'rb+') as journal:
+            content = journal.read()
+            # A crash mid-write can leave a truncated last line; cut it off so the next record starts on a
+            # line of its own instead of being glued onto it
+            complete = content.rfind(b'\n') + 1
+            if complete < len(content):
+                journal.truncate(complete)
+        lines = content[:complete].decode('utf-8', errors='replace').splitlines()
+        try:
+            header = json.loads(lines[0]) if lines else None
+        except ValueError:
+            header = None
+        if header != self.header:
+            print(f"Discarding {self.path}: it was written for a different input.")
+            os.remove(self.path)
+            return []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def append(self, record):
+        if self._file is None:
+            fresh = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            unterminated = not fresh and self._last_byte() != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if fresh:
+                self._file.write(json.dumps(self.header) + '\n')
+            elif unterminated:
+                # Never append onto a line a crash cut short
+                self._file.write('\n')
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def _last_byte(self):
+        with open(self.path, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            return journal.read(1)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,68 @@
+# pip install pandas pyarrow
+
+import argparse
+
+import pandas as pd
+
+from checkpoint import atomic_write_csv
+from package_store import parse_dates
+
+# Input and output CSV file names
+input_file = "updated_packages.csv"  # tracking.py output; a raw packages.csv export works too
+output_file = "Cleaned_Package_Data.csv"
+
+# Columns of the mailroom export we keep, in Cleaned_Package_Data.csv order
+KEEP_COLUMNS = ["Location 1", "Locker Number", "Locker Bank", "Carrier", "Tracking #", "Transaction Status ",
+                "Routed Date Time", "Stored Date Time", "Delivered Date Time"]
+ORIGIN_COLUMNS = ["Origin City", "Origin State", "Origin Zip", "Origin Country"]
+DATE_COLUMNS = ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]
+
+
+# m/d/YYYY H:MM without zero padding, like the rest of the cleaned data
+def format_dates(dates):
+    text = (dates.dt.month.astype("Int64").astype(str) + "/" + dates.dt.day.astype("Int64").astype(str) + "/"
+            + dates.dt.year.astype("Int64").astype(str) + " " + dates.dt.hour.astype("Int64").astype(str) + ":"
+            + dates.dt.minute.astype("Int64").astype(str).str.zfill(2))
+    return text.where(dates.notna())
+
+
+def clean_packages(raw):
+    df = raw[KEEP_COLUMNS].copy()
+    df["Tracking #"] = df["Tracking #"].astype(str).str.strip().str.rstrip("_").where(df["Tracking #"].notna())
+
+    dates = {column: parse_dates(df[column]) for column in DATE_COLUMNS}
+    for column in DATE_COLUMNS:
+        df[column] = format_dates(dates[column])
+    df["Routed Date Time"] = df["Routed Date Time"].fillna("Unknown")
+
+    for column in ORIGIN_COLUMNS:
+        df[column] = raw[column] if column in raw.columns else pd.NA
+
+    # "Bank 7 Locker 2.0", only when both the bank and the locker are known
+    locker = pd.to_numeric(df["Locker Number"], errors="coerce")
+    df["Bank_Locker"] = (df["Locker Bank"] + " Locker " + locker.map("{:.1f}".format)).where(
+        df["Locker Bank"].notna() & locker.notna())
+
+    # Numeric mailbox numbers are undergrad boxes, "G..." ones are grad boxes
+    location = df["Location 1"].astype(str).str.strip()
+    df["Undergrad_Box"] = df["Location 1"].where(location.str.fullmatch(r"\d+"))
+    df["Grad_Box"] = df["Location 1"].where(location.str.startswith("G") & df["Location 1"].notna())
+
+    df["Processing Time (Hours)"] = (dates["Delivered Date Time"] - dates["Stored Date Time"]).dt.total_seconds() / 3600
+    df["Origin County"] = raw["Origin County"] if "Origin County" in raw.columns else pd.NA
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn a mailroom export into Cleaned_Package_Data.csv.")
+    parser.add_argument("--input", default=input_file)
+    parser.add_argument("--output", default=output_file)
+    args = parser.parse_args()
+
+    df = clean_packages(pd.read_csv(args.input))
+    atomic_write_csv(df, args.output)
+    print(f"Cleaned {len(df)} packages into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
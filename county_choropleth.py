@@ -0,0 +1,177 @@
+# pip install pandas numpy plotly
+#
+# The county heat map as a Plotly choropleth for the Dash app, drawn from the same topology as the D3 pages
+# (counties-albers-simplified.json from build_topojson.py, or the full counties-albers-10m.json).
+#
+# us-atlas has already projected those counties to Albers in a 975 x 610 frame. The pixel coordinates are
+# mapped linearly to small lon / lat offsets and drawn with Plotly's equirectangular projection, which is
+# linear too, so the map looks exactly like the D3 one. The geometry is converted once per file and sent
+# with the page; a filter or scale change only sends the new fill values (see `fill`), never the shapes.
+
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from build_topojson import SIMPLIFIED_FILE, VENDORED_FILE, decode_arcs
+from package_cubes import FILTER_COLUMNS, with_unknown
+
+GEOMETRY_FILES = [SIMPLIFIED_FILE, VENDORED_FILE]
+FRAME_WIDTH, FRAME_HEIGHT = 975, 610
+# Small enough that Plotly's great-circle edges are indistinguishable from the straight ones D3 draws
+DEGREES_PER_PIXEL = 0.01
+
+# Same colours as countymaplog.html
+NO_PACKAGES = "#fcfcfc"
+LOW, HIGH = "#ffe6e6", "#ff0000"
+LOG_STOPS = 24
+
+
+class CountyGeometry:
+    def __init__(self, ids, names, geojson, path):
+        # 5-digit FIPS codes, in the order every fill array follows
+        self.ids = ids
+        self.names = names
+        self.geojson = geojson
+        self.path = path
+
+
+def to_degrees(point):
+    x, y = point
+    return [round((x - FRAME_WIDTH / 2) * DEGREES_PER_PIXEL, 5), round((FRAME_HEIGHT / 2 - y) * DEGREES_PER_PIXEL, 5)]
+
+
+def signed_area(ring):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:])) / 2
+
+
+# Plotly (d3-geo) reads clockwise rings as the inside and counter-clockwise ones as holes
+def wind(ring, exterior):
+    clockwise = signed_area(ring) < 0
+    return ring if clockwise == exterior else ring[::-1]
+
+
+def stitch_ring(arcs, references):
+    ring = []
+    for reference in references:
+        arc = arcs[reference] if reference >= 0 else arcs[~reference][::-1]
+        # Consecutive arcs share their joining point
+        ring.extend(arc[1:] if ring else arc)
+    return [to_degrees(point) for point in ring]
+
+
+# Rings of a polygon, or None when its exterior has no area. Islands smaller than a quantization cell collapse
+# to a line or a point, which Plotly's spherical geometry can take for a ring around the rest of the globe, so
+# those rings are left out.
+def polygon(arcs, rings):
+    stitched = [stitch_ring(arcs, references) for references in rings]
+    kept = [wind(ring, exterior=(i == 0)) for i, ring in enumerate(stitched) if signed_area(ring) != 0]
+    return kept if stitched and signed_area(stitched[0]) != 0 else None
+
+
+# GeoJSON features for one object of a TopoJSON topology
+def topology_features(topology, name="counties"):
+    arcs = decode_arcs(topology)
+    features = []
+    for geometry in topology["objects"][name]["geometries"]:
+        if geometry.get("type") == "Polygon":
+            polygons = [polygon(arcs, geometry["arcs"])]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = [polygon(arcs, rings) for rings in geometry["arcs"]]
+        else:
+            continue
+        polygons = [rings for rings in polygons if rings]
+        if not polygons:
+            continue
+        shape = ({"type": "Polygon", "coordinates": polygons[0]} if len(polygons) == 1
+                 else {"type": "MultiPolygon", "coordinates": polygons})
+        features.append({"type": "Feature", "id": geometry["id"], "properties": geometry.get("properties", {}),
+                         "geometry": shape})
+    return features
+
+
+@lru_cache(maxsize=2)
+def _load(path, mtime_ns):
+    with open(path, encoding="utf-8") as topology_file:
+        features = topology_features(json.load(topology_file))
+    return CountyGeometry(ids=[feature["id"] for feature in features],
+                          names=[feature["properties"].get("name", "") for feature in features],
+                          geojson={"type": "FeatureCollection", "features": features}, path=path)
+
+
+# The first county topology found, converted once per file version; None if build_topojson.py has not run
+def load_geometry(paths=GEOMETRY_FILES):
+    for path in paths:
+        if os.path.exists(path):
+            return _load(path, os.stat(path).st_mtime_ns)
+    return None
+
+
+class CountyCounts:
+    # Packages per routed day x carrier x locker bank x origin state x county, grouped once like the cube
+    def __init__(self, df):
+        known = df["County FIPS"].notna()
+        df = df[known]
+        keys = pd.DataFrame({
+            "day": df["Routed Date Time"].dt.normalize(),
+            **{column: with_unknown(df[column]) for column in FILTER_COLUMNS},
+            "fips": df["County FIPS"].astype(int).map("{:05d}".format),
+        })
+        self.cells = keys.groupby(list(keys.columns), observed=True).size().rename("count").reset_index()
+
+    # Counts in the order of `ids`, for the same filters as PackageCube.select
+    def counts(self, ids, start=None, end=None, carriers=None, banks=None, states=None):
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= (cells["day"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (cells["day"] <= pd.Timestamp(end)).to_numpy()
+        for column, chosen in zip(FILTER_COLUMNS, (carriers, banks, states)):
+            if chosen:
+                mask &= cells[column].isin(chosen).to_numpy()
+        per_county = cells[mask].groupby("fips")["count"].sum()
+        return per_county.reindex(ids, fill_value=0).to_numpy()
+
+
+def mix(low, high, t):
+    a, b = (np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)]) for color in (low, high))
+    return "#" + "".join(f"{round(value):02x}" for value in a + (b - a) * t)
+
+
+# What changes on the choropleth trace for new counts / scale. z stays the real count (it is what the hover
+# shows); the log scale puts log-spaced stops into the colour scale instead, like d3.scaleLog in
+# countymaplog.html. Counties without packages sit below the first stop and get the "no packages" grey.
+def fill(counts, scale="log"):
+    top = max(int(counts.max()) if len(counts) else 0, 2)
+    one = 1 / top
+    colorscale = [[0, NO_PACKAGES], [one * 0.999, NO_PACKAGES]]
+    if scale == "log":
+        colorscale += [[float(top ** t / top), mix(LOW, HIGH, t)] for t in np.linspace(0, 1, LOG_STOPS + 1)]
+        ticks = [10 ** power for power in range(int(np.log10(top)) + 1)]
+        colorbar = {"tickvals": ticks, "ticktext": [f"{tick:,}" for tick in ticks], "title": {"text": "Packages (log)"}}
+    else:
+        colorscale += [[one, LOW], [1, HIGH]]
+        colorbar = {"tickvals": None, "ticktext": None, "title": {"text": "Packages"}}
+    return {"z": counts.tolist(), "zmin": 0, "zmax": top, "colorscale": colorscale, "colorbar": colorbar}
+
+
+# The full figure with the geometry, sent once per page load; later updates only `fill` its one trace
+def base_figure(geometry, counts, scale="log"):
+    if geometry is None:
+        fig = go.Figure()
+        fig.add_annotation(text="No county geometry yet: run build_topojson.py", showarrow=False)
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False)
+        return fig
+
+    fig = go.Figure(go.Choropleth(geojson=geometry.geojson, locations=geometry.ids, customdata=geometry.names,
+                                  marker_line=dict(color="#bbbbbb", width=0.2),
+                                  hovertemplate="%{customdata} (%{location})<br>%{z:,} packages<extra></extra>",
+                                  **fill(counts, scale)))
+    fig.update_geos(visible=False, projection_type="equirectangular", fitbounds="locations")
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=600, uirevision="county-map")
+    return fig
@@ -0,0 +1,174 @@
+# pip install pandas plotly
+#
+# The dashboard's data preparation and figures, shared by the Dash app (Sankey_Diagram_Latest.py) and the
+# static report export (export_snapshots.py), so a snapshot looks exactly like the chart on screen.
+#
+# The cube charts take a filtered CubeSlice (see `select`); the line chart and the county map take their
+# own structures from build_dashboard_data plus the filter values the dashboard's controls send: start / end
+# day, then lists of carriers, locker banks and origin states.
+
+from types import SimpleNamespace
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from county_choropleth import CountyCounts, base_figure
+from occupancy import LockerOccupancy
+from package_cubes import WEEKDAYS, PackageCube
+from quantile_sketch import SketchTable
+from sankey_flow import SankeyFlow
+from timeseries import ProcessingSeries
+
+date_columns = ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]
+SANKEY_LEVELS = ["Origin State", "Carrier", "Locker Bank"]
+
+
+# The rows the charts count, from a typed frame (dates already datetime64, 'Routed → Stored',
+# 'Stored → Delivered' and 'Total Processing Time' already in hours)
+def prepare_rows(frame):
+    df = frame.dropna(subset=["Routed Date Time", "Delivered Date Time"])
+    # Carriers that only had dropped rows should not show up as empty bars/slices
+    df['Carrier'] = df['Carrier'].cat.remove_unused_categories()
+
+    # Explicitly cast NaN values in datetime columns to a compatible type
+    df[date_columns] = df[date_columns].fillna(pd.Timestamp('1970-01-01'))
+    return df
+
+
+# Everything the charts read, built from one typed frame. `sketches` may be passed in already built (see
+# extend_dashboard_data).
+def build_dashboard_data(frame, sketches=None):
+    # Lockers in use per bank over time, from the real stored / delivered times (before the fill)
+    occupancy = LockerOccupancy(frame)
+    df = prepare_rows(frame)
+
+    # Counts and sums per day x hour x carrier x bank x state, built once; the filters only re-sum these cells
+    cube = PackageCube(df)
+    first_day, last_day = cube.date_range()
+    # Sorted (routed time, processing time) arrays the line chart is downsampled from
+    series = ProcessingSeries(df)
+    # Packages per county under the same filters, for the choropleth
+    counties = CountyCounts(df)
+    # Processing time quantile sketches per day x carrier x bank x state, merged per filter
+    sketches = sketches if sketches is not None else SketchTable(df)
+    return SimpleNamespace(df=df, cube=cube, series=series, counties=counties, occupancy=occupancy,
+                           sketches=sketches, first_day=first_day, last_day=last_day)
+
+
+# For DataStore: rows were appended to the file, so only their sketches are built and merged into the old ones
+def extend_dashboard_data(previous, appended, frame):
+    return build_dashboard_data(frame, sketches=previous.sketches.extended(prepare_rows(appended)))
+
+
+def select(data, start=None, end=None, carriers=None, banks=None, states=None):
+    return data.cube.select(start, end, carriers, banks, states)
+
+
+# sketch: the QuantileSketch for the same filters. The median and p90 say more than the mean, which a few
+# packages left for months pull far up.
+def stats(selected, sketch):
+    median, p90 = sketch.quantiles([0.5, 0.9])
+    return (f"📦 Total Packages: {len(selected)}", f"🚚 Top Carrier: {selected.top_carrier()}",
+            f"⏳ Processing Time: median {median:.1f} h, p90 {p90:.1f} h (avg. {selected.mean_total():.1f} h)")
+
+
+# Origin state -> carrier -> locker bank, counted from the selected cube cells
+def sankey_figure(selected):
+    flow = SankeyFlow(selected.cells, SANKEY_LEVELS, value="total", weight="count")
+    return flow.figure(title="📦 Package Flow: " + " → ".join(SANKEY_LEVELS))
+
+
+def carrier_bar_figure(selected):
+    carrier_counts = selected.carrier_counts()
+    fig = px.bar(carrier_counts, x='Carrier', y='Count', title="📊 Carrier Distribution", color='Carrier')
+    return fig
+
+
+# With a sketch, its p50 / p90 / p99 are marked on the histogram
+def histogram_figure(selected, sketch=None):
+    bins = selected.histogram()
+    # Fixed bin edges from the cube, drawn as touching bars like px.histogram
+    fig = go.Figure(go.Bar(x=(bins['start'] + bins['end']) / 2, y=bins['Count'], width=bins['end'] - bins['start']))
+    fig.update_layout(title="⏳ Processing Time Distribution", xaxis_title="Total Processing Time",
+                      yaxis_title="count", bargap=0)
+    if sketch is not None and len(sketch):
+        for name, value in zip(["p50", "p90", "p99"], sketch.quantiles([0.5, 0.9, 0.99])):
+            fig.add_vline(x=value, line=dict(dash='dash', width=1), annotation_text=f"{name} {value:.0f} h")
+    return fig
+
+
+# zoom_start / zoom_end narrow the window further (the line chart's visible range), or are None
+def line_chart_figure(series, start=None, end=None, carriers=None, banks=None, states=None, zoom_start=None,
+                      zoom_end=None):
+    # The date filter is by day; the zoom range can be narrower than that
+    end = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns') if end else None
+    if zoom_start is not None:
+        start = max(pd.Timestamp(start), pd.Timestamp(zoom_start)) if start else pd.Timestamp(zoom_start)
+        end = min(end, pd.Timestamp(zoom_end)) if end is not None else pd.Timestamp(zoom_end)
+    bands = series.bands(start, end, carriers, banks, states)
+
+    fig = go.Figure([
+        go.Scatter(x=bands['time'], y=bands['max'], mode='lines', line=dict(width=0), name='max', showlegend=False),
+        go.Scatter(x=bands['time'], y=bands['min'], mode='lines', line=dict(width=0), name='min range',
+                   fill='tonexty', fillcolor='rgba(99, 110, 250, 0.25)'),
+        go.Scatter(x=bands['time'], y=bands['mean'], mode='lines', name='mean', line=dict(color='#636EFA'),
+                   customdata=bands['count'], hovertemplate="%{x}<br>%{y:.1f} h (%{customdata} packages)<extra></extra>"),
+    ])
+    fig.update_layout(title="📊 Processing Time Over Time", xaxis_title="Routed Date Time",
+                      yaxis_title="Total Processing Time", uirevision='line-chart')
+    if zoom_start is not None:
+        fig.update_xaxes(range=[zoom_start, zoom_end])
+    return fig
+
+
+def pie_chart_figure(selected):
+    carrier_counts = selected.carrier_counts()
+    fig = px.pie(carrier_counts, names='Carrier', values='Count', title="📦 Package Volume by Carrier")
+    return fig
+
+
+def heatmap_figure(selected):
+    # Read-only 7 x 24 array precomputed in the cube; nothing here touches the shared frame
+    matrix = selected.pickup_matrix()
+    fig = go.Figure(go.Heatmap(z=matrix, x=list(range(24)), y=WEEKDAYS,
+                               hovertemplate="%{y} %{x}:00<br>Count=%{z}<extra></extra>"))
+    fig.update_layout(title="🔥 Pickup Trends", xaxis_title="Hour of Day", yaxis_title="Day of Week")
+    return fig
+
+
+def county_map_figure(counties, geometry, *filters, scale="log"):
+    counts = counties.counts(geometry.ids, *filters) if geometry else None
+    return base_figure(geometry, counts, scale)
+
+
+# Lockers occupied per bank, with each bank's capacity dotted in the same colour. Occupancy is physical, so
+# only the date range and locker banks filter it.
+def occupancy_figure(occupancy, start=None, end=None, banks=None):
+    end = pd.Timestamp(end) + pd.Timedelta(days=1) if end else None
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, bank in enumerate(banks or occupancy.banks):
+        if bank not in occupancy.series:
+            continue
+        color = colors[i % len(colors)]
+        points = occupancy.points(bank, start, end)
+        fig.add_trace(go.Scatter(x=points['time'], y=points['occupancy'], mode='lines', line_shape='hv',
+                                 name=bank, line=dict(color=color),
+                                 hovertemplate=f"{bank}<br>%{{x}}<br>%{{y}} lockers in use<extra></extra>"))
+        if occupancy.capacity.get(bank):
+            fig.add_hline(y=occupancy.capacity[bank], line=dict(color=color, dash='dot', width=1))
+    fig.update_layout(title="🗄️ Lockers in Use (peak per time bucket)", xaxis_title="Time",
+                      yaxis_title="Occupied lockers")
+    return fig
+
+
+def occupancy_stats_figure(occupancy, start=None, end=None, banks=None):
+    end = pd.Timestamp(end) + pd.Timedelta(days=1) if end else None
+    table = occupancy.stats(start, end, banks)
+    table["Mean"] = table["Mean"].round(1)
+    table["Hours at capacity"] = table["Hours at capacity"].round(1)
+    fig = go.Figure(go.Table(header=dict(values=list(table.columns)),
+                             cells=dict(values=[table[column] for column in table.columns])))
+    fig.update_layout(title="🗄️ Occupancy by Locker Bank (time-weighted percentiles)")
+    return fig
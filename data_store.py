@@ -0,0 +1,121 @@
+# pip install pandas pyarrow
+#
+# Keeps a dashboard's data current without restarting it.
+#
+# A DataStore loads a cleaned package CSV, hands the typed frame to a `build` function (which does whatever
+# preprocessing the app wants: dropping rows, building cubes, ...) and publishes the result as `current`.
+# A background thread polls the file and, when it changes, builds the next version off to the side and swaps
+# it in with a single assignment, so callbacks always see one complete version and never wait for a reload.
+# When the new file is the old one with rows appended, only the appended bytes are parsed, and an optional
+# `extend(previous data, appended rows, frame)` can update the previous version instead of building anew.
+
+import hashlib
+import io
+import threading
+
+import pandas as pd
+
+from instrumentation import metrics
+from package_store import TEXT_COLUMNS, concat_columnar, load_packages, source_stamp, to_columnar
+
+
+class DataVersion:
+    def __init__(self, stamp, frame, data):
+        # Identifies the file contents this version was built from (also used in cache keys)
+        self.stamp = stamp
+        # Typed frame as loaded, before the app's preprocessing
+        self.frame = frame
+        # Whatever `build` returned
+        self.data = data
+
+
+class DataStore:
+    def __init__(self, csv_path, build, poll_seconds=5.0, extend=None):
+        self.csv_path = csv_path
+        self.build = build
+        self.extend = extend
+        self.poll_seconds = poll_seconds
+        self.reloads = 0
+        self.appends = 0
+        self._stop = threading.Event()
+        self._thread = None
+        # Length and digest of the file contents the current version was parsed from
+        self._size = 0
+        self._digest = None
+        self._columns = None
+        self.current = self._load_full()
+
+    @property
+    def data(self):
+        return self.current.data
+
+    @property
+    def version(self):
+        return self.current.stamp
+
+    def _read_bytes(self):
+        with open(self.csv_path, "rb") as source:
+            return source.read()
+
+    # Stamp first: if the file changes while we read it, the next poll sees a newer stamp and loads again
+    def _load_full(self):
+        stamp = source_stamp(self.csv_path).decode()
+        content = self._read_bytes()
+        frame = load_packages(self.csv_path)
+        self._columns = list(pd.read_csv(io.BytesIO(content), nrows=0).columns)
+        self._size, self._digest = len(content), hashlib.sha256(content).digest()
+        with metrics.span("dashboard_build"):
+            data = self.build(frame)
+        return DataVersion(stamp, frame, data)
+
+    # The next version, parsing only the new rows if the file only grew at the end
+    def _load_next(self):
+        stamp = source_stamp(self.csv_path).decode()
+        content = self._read_bytes()
+        old = self.current
+        appended = (len(content) > self._size and self._size > 0 and content[self._size - 1:self._size] == b"\n"
+                    and hashlib.sha256(content[:self._size]).digest() == self._digest)
+        if not appended:
+            self.reloads += 1
+            return self._load_full()
+
+        tail = pd.read_csv(io.BytesIO(content[self._size:]), header=None, names=self._columns,
+                           dtype={column: str for column in TEXT_COLUMNS})
+        # Only the new rows are parsed; the loaded frame is already typed
+        tail = to_columnar(tail)
+        frame = concat_columnar([old.frame, tail])
+        self._size, self._digest = len(content), hashlib.sha256(content).digest()
+        self.appends += 1
+        print(f"Appended {len(tail)} new rows from {self.csv_path}")
+        with metrics.span("dashboard_extend" if self.extend else "dashboard_build"):
+            data = self.extend(old.data, tail, frame) if self.extend else self.build(frame)
+        return DataVersion(stamp, frame, data)
+
+    # Check the file once; returns True if a new version was swapped in
+    def refresh(self):
+        try:
+            if source_stamp(self.csv_path).decode() == self.current.stamp:
+                return False
+            self.current = self._load_next()
+        except (OSError, ValueError, pd.errors.ParserError) as error:
+            # A half-written or unreadable file: keep serving the current version and try again next poll
+            print(f"Reload of {self.csv_path} failed, keeping the current data: {error}")
+            return False
+        print(f"Loaded new data from {self.csv_path} ({len(self.current.frame)} rows)")
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.refresh()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="data-store-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,164 @@
+# pip install pandas numpy pyarrow
+#
+# Everything the D3/Plotly pages draw, pre-aggregated into one small JSON file, so the pages no longer
+# download and parse the whole cleaned CSV to re-count it in the browser.
+#
+#   python export_aggregates.py --input Cleaned_Package_Data_County_FIPS.csv --output package_aggregates.json
+#
+# The pipeline's publish stage writes it next to the published CSV, and the Dash app serves the same data for
+# the version it has loaded at /api/aggregates.json.
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from package_store import load_packages
+
+AGGREGATES_FILE = "package_aggregates.json"
+# Bump when the layout of the JSON changes so pages can tell what they are reading
+SCHEMA_VERSION = 1
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+HISTOGRAM_BINS = 50
+# The processing time histogram leaves out extreme outliers, as the pages always did
+HISTOGRAM_MAX_HOURS = 200
+
+
+def rounded(values, digits=3):
+    return [None if pd.isna(value) else round(float(value), digits) for value in values]
+
+
+def carrier_names(frame):
+    return frame["Carrier"].astype(object).where(frame["Carrier"].notna(), "Unknown")
+
+
+def summary(frame):
+    total = frame["Total Processing Time"]
+    timed = total.notna() & (total != 0)
+    # Rows where all three scans are known, for the Sankey's two stage averages
+    flow = frame[["Routed Date Time", "Stored Date Time", "Delivered Date Time"]].notna().all(axis=1)
+    known = frame["Carrier"].dropna()
+    return {
+        "total_packages": len(frame),
+        "top_carrier": str(known.value_counts().idxmax()) if len(known) else "",
+        "avg_processing_hours": round(float(total[timed].mean()), 3) if timed.any() else None,
+        "routed_to_stored_hours": round(float(frame.loc[flow, "Routed → Stored"].mean()), 3) if flow.any() else None,
+        "stored_to_delivered_hours": round(float(frame.loc[flow, "Stored → Delivered"].mean()), 3) if flow.any() else None,
+        "flow_packages": int(flow.sum()),
+    }
+
+
+def carriers(frame):
+    counts = carrier_names(frame).value_counts()
+    return {"names": [str(name) for name in counts.index], "counts": counts.astype(int).tolist()}
+
+
+def processing_histogram(frame):
+    hours = frame["Total Processing Time"]
+    hours = hours[hours.notna() & (hours < HISTOGRAM_MAX_HOURS)].to_numpy()
+    if len(hours) == 0:
+        return {"edges": [], "counts": []}
+    counts, edges = np.histogram(hours, bins=HISTOGRAM_BINS)
+    return {"edges": rounded(edges), "counts": counts.tolist()}
+
+
+def daily_processing(frame):
+    total = frame["Total Processing Time"]
+    timed = frame["Routed Date Time"].notna() & total.notna() & (total != 0)
+    daily = total[timed].groupby(frame.loc[timed, "Routed Date Time"].dt.normalize()).mean()
+    return {"dates": [day.strftime("%Y-%m-%d") for day in daily.index], "avg_hours": rounded(daily)}
+
+
+def pickup_matrix(frame):
+    delivered = frame["Delivered Date Time"].dropna()
+    matrix = np.zeros((len(WEEKDAYS), 24), dtype=np.int64)
+    np.add.at(matrix, (delivered.dt.dayofweek.to_numpy(), delivered.dt.hour.to_numpy()), 1)
+    return {"days": WEEKDAYS, "hours": list(range(24)), "counts": matrix.tolist()}
+
+
+# Packages per county (5-digit FIPS, as the us-atlas ids) with a name for the tooltip, plus the same counts
+# split by carrier as [county index, carrier index, count] so the map can be filtered by carrier
+def counties(frame):
+    rows = frame[frame["County FIPS"].notna()]
+    fips = rows["County FIPS"].astype(int).map("{:05d}".format)
+    grouped = rows.assign(fips=fips).groupby("fips", sort=True)
+    names = grouped[["Origin County", "Origin State"]].last()
+    counts = grouped.size()
+
+    by_carrier = pd.DataFrame({"fips": fips, "carrier": carrier_names(rows)}).value_counts()
+    county_index = {code: i for i, code in enumerate(counts.index)}
+    carrier_list = sorted(by_carrier.index.get_level_values("carrier").unique())
+    carrier_index = {name: i for i, name in enumerate(carrier_list)}
+    return {
+        "fips": list(counts.index),
+        "county": [None if pd.isna(name) else str(name) for name in names["Origin County"]],
+        "state": [None if pd.isna(name) else str(name) for name in names["Origin State"]],
+        "counts": counts.astype(int).tolist(),
+        "carriers": carrier_list,
+        "by_carrier": sorted([county_index[code], carrier_index[carrier], int(count)]
+                             for (code, carrier), count in by_carrier.items()),
+    }
+
+
+# frame is a typed package frame from package_store.load_packages
+def build_aggregates(frame, data_version, source=None):
+    return {
+        "schema": SCHEMA_VERSION,
+        "data_version": data_version,
+        "source": source,
+        "generated": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "summary": summary(frame),
+        "carriers": carriers(frame),
+        "processing_histogram": processing_histogram(frame),
+        "daily_processing": daily_processing(frame),
+        "pickup_matrix": pickup_matrix(frame),
+        "counties": counties(frame),
+    }
+
+
+def dumps(aggregates):
+    return json.dumps(aggregates, ensure_ascii=False, separators=(",", ":"))
+
+
+# Same temp file + rename as atomic_write_csv, so a page never fetches a half-written file
+def write_aggregates(aggregates, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            temp_file.write(dumps(aggregates))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def export_csv(csv_path, output):
+    # The CSV's content hash, so the version only changes when the data does
+    with open(csv_path, "rb") as source:
+        data_version = hashlib.sha256(source.read()).hexdigest()[:16]
+    aggregates = build_aggregates(load_packages(csv_path), data_version, source=os.path.basename(csv_path))
+    write_aggregates(aggregates, output)
+    return aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-aggregate the cleaned package data for the D3 pages.")
+    parser.add_argument("--input", default="Cleaned_Package_Data_County_FIPS.csv")
+    parser.add_argument("--output", default=AGGREGATES_FILE)
+    args = parser.parse_args()
+
+    export_csv(args.input, args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1024:.1f} KB, "
+          f"{os.path.getsize(args.input) / 1024:.1f} KB CSV)")
+
+
+if __name__ == "__main__":
+    main()
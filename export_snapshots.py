@@ -0,0 +1,186 @@
+# pip install pandas plotly            (PNG / SVG also need: pip install kaleido)
+#
+# Renders every dashboard chart to static files for the daily reports, without opening the Dash app or
+# index.html to take screenshots.
+#
+#   python export_snapshots.py                                      # the whole date range, as HTML
+#   python export_snapshots.py --every month --formats html png     # one report per month
+#   python export_snapshots.py --range 2024-09-01:2024-09-30 --range 2024-10-01:2024-10-31 --carrier UPS
+#
+# The CSV is loaded and prepared once, with the same build_dashboard_data and figure functions as the app.
+# The charts of all reports are then built and written by a process pool: the workers are forked from the
+# loaded process and share its data, so a task only builds and writes one figure.
+#
+# Output: <output>/<report>/<chart>.<format> plus <output>/<report>/index.html with the report's stats,
+# and <output>/index.html listing the reports. The HTML charts share one plotly.min.js in <output>.
+
+import argparse
+import html
+import importlib.util
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from county_choropleth import load_geometry
+from dashboard_figures import (build_dashboard_data, carrier_bar_figure, county_map_figure, heatmap_figure,
+                               histogram_figure, line_chart_figure, occupancy_figure, pie_chart_figure, sankey_figure,
+                               select, stats)
+from package_store import load_packages
+
+INPUT_FILE = "Cleaned_Package_Data_County_FIPS.csv"
+OUTPUT_DIR = "snapshots"
+FORMATS = ["html", "svg", "png"]
+PERIODS = {"day": "D", "week": "W-SUN", "month": "M"}
+
+CHARTS = {
+    "sankey": lambda data, report: sankey_figure(select(data, *report.filters)),
+    "carrier_bar": lambda data, report: carrier_bar_figure(select(data, *report.filters)),
+    "histogram": lambda data, report: histogram_figure(select(data, *report.filters),
+                                                       data.sketches.sketch(*report.filters)),
+    "line_chart": lambda data, report: line_chart_figure(data.series, *report.filters),
+    "pie_chart": lambda data, report: pie_chart_figure(select(data, *report.filters)),
+    "heatmap": lambda data, report: heatmap_figure(select(data, *report.filters)),
+    "county_map": lambda data, report: county_map_figure(data.counties, load_geometry(), *report.filters),
+    "occupancy": lambda data, report: occupancy_figure(data.occupancy, report.start, report.end, report.banks),
+}
+
+
+class Report:
+    def __init__(self, start, end, carriers=None, banks=None, states=None):
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end)
+        self.carriers = carriers
+        self.banks = banks
+        self.states = states
+
+    # In the order the figure functions take them
+    @property
+    def filters(self):
+        return (self.start, self.end, self.carriers, self.banks, self.states)
+
+    # Directory name, e.g. 2024-09-01_2024-09-30 or 2024-09-01_2024-09-30_UPS
+    @property
+    def name(self):
+        parts = [f"{self.start:%Y-%m-%d}_{self.end:%Y-%m-%d}"]
+        for chosen in (self.carriers, self.banks, self.states):
+            if chosen:
+                parts.append("+".join(chosen))
+        return "_".join(parts).replace("/", "-").replace(" ", "-")
+
+
+# Set in the parent before the pool forks, so workers start with it; loaded by the worker otherwise
+_data = None
+
+
+def prepare(csv_path):
+    global _data
+    if _data is None:
+        _data = build_dashboard_data(load_packages(csv_path))
+        # Converted once here too, so forked workers inherit the county shapes
+        load_geometry()
+    return _data
+
+
+def render(task):
+    report, chart, formats, directory = task
+    started = time.perf_counter()
+    fig = CHARTS[chart](_data, report)
+    paths = []
+    for file_format in formats:
+        path = os.path.join(directory, f"{chart}.{file_format}")
+        if file_format == "html":
+            fig.write_html(path, include_plotlyjs="../plotly.min.js")
+        else:
+            fig.write_image(path, width=1200, height=700)
+        paths.append(path)
+    return paths, time.perf_counter() - started
+
+
+def reports_for(data, ranges, every, carriers, banks, states):
+    if ranges:
+        bounds = [tuple(pd.Timestamp(day) for day in text.split(":", 1)) for text in ranges]
+    elif every:
+        periods = pd.period_range(data.first_day, data.last_day, freq=PERIODS[every])
+        bounds = [(max(period.start_time.normalize(), data.first_day), min(period.end_time.normalize(), data.last_day))
+                  for period in periods]
+    else:
+        bounds = [(data.first_day, data.last_day)]
+    return [Report(start, end, carriers, banks, states) for start, end in bounds]
+
+
+def write_index(path, title, body):
+    with open(path, "w", encoding="utf-8") as index:
+        index.write(f"<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head>\n"
+                    f"<body>\n<h1>{html.escape(title)}</h1>\n{body}\n</body></html>\n")
+
+
+def write_report_index(report, directory, charts, formats):
+    summary = stats(select(_data, *report.filters), _data.sketches.sketch(*report.filters))
+    lines = "".join(f"<li>{html.escape(line)}</li>" for line in summary)
+    links = "".join(f"<li>{chart}: " + " ".join(f"<a href='{chart}.{file_format}'>{file_format}</a>"
+                                                  for file_format in formats) + "</li>" for chart in charts)
+    write_index(os.path.join(directory, "index.html"), report.name, f"<ul>{lines}</ul>\n<ul>{links}</ul>")
+
+
+def export(csv_path, output, ranges=None, every=None, carriers=None, banks=None, states=None, formats=("html",),
+           charts=tuple(CHARTS), workers=None):
+    data = prepare(csv_path)
+    if "county_map" in charts and load_geometry() is None:
+        print("No county geometry (run build_topojson.py), skipping the county map")
+        charts = [chart for chart in charts if chart != "county_map"]
+    reports = reports_for(data, ranges, every, carriers, banks, states)
+
+    os.makedirs(output, exist_ok=True)
+    if "html" in formats:
+        with open(os.path.join(output, "plotly.min.js"), "w", encoding="utf-8") as plotly_js:
+            plotly_js.write(get_plotlyjs())
+    tasks = []
+    for report in reports:
+        directory = os.path.join(output, report.name)
+        os.makedirs(directory, exist_ok=True)
+        write_report_index(report, directory, charts, formats)
+        tasks.extend((report, chart, formats, directory) for chart in charts)
+    write_index(os.path.join(output, "index.html"), "Package reports",
+                "<ul>" + "".join(f"<li><a href='{report.name}/index.html'>{report.name}</a></li>"
+                                 for report in reports) + "</ul>")
+
+    started = time.perf_counter()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=prepare,
+                             initargs=(csv_path,)) as pool:
+        results = list(pool.map(render, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count())))))
+    files = sum(len(paths) for paths, _ in results)
+    busy = sum(seconds for _, seconds in results)
+    print(f"Wrote {files} files for {len(reports)} reports to {output} in {time.perf_counter() - started:.1f} s "
+          f"({busy:.1f} s of rendering)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every dashboard chart to static files.")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_DIR)
+    parser.add_argument("--range", action="append", dest="ranges", metavar="START:END",
+                        help="Routed date range of one report (repeatable)")
+    parser.add_argument("--every", choices=sorted(PERIODS), help="One report per day / week / month of the data")
+    parser.add_argument("--carrier", action="append", dest="carriers")
+    parser.add_argument("--bank", action="append", dest="banks")
+    parser.add_argument("--state", action="append", dest="states")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["html"])
+    parser.add_argument("--charts", nargs="+", choices=list(CHARTS), default=list(CHARTS))
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if set(args.formats) - {"html"} and importlib.util.find_spec("kaleido") is None:
+        parser.error("SVG / PNG export needs kaleido: pip install kaleido")
+    export(args.input, args.output, args.ranges, args.every, args.carriers, args.banks, args.states, args.formats,
+           args.charts, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# pip install plotly
+#
+# Rendered Dash callback results (Plotly figures, stat strings) memoized in a SQLite file.
+#
+# Entries are keyed on (callback name, dataset version, filter state), so a changed data file never serves
+# old figures; `version` may also be a function returning the version currently served, for apps that
+# reload their data. Such apps should rather pass `snapshot`, a function returning the data being served
+# (anything with a `stamp`): each call then reads it once, keys on its stamp and hands that same snapshot to
+# the function, so a reload in the middle of a call can never file a figure of the new data under the old
+# version. Every gunicorn worker opens the same file, so a figure rendered by one worker is a hit for the
+# others. The file is kept below `max_entries` figures by evicting the least recently used ones.
+
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from plotly.utils import PlotlyJSONEncoder
+
+# Hits only refresh an entry's LRU timestamp once this many seconds have passed, so reads rarely write
+TOUCH_INTERVAL = 60
+
+
+class FigureCache:
+    def __init__(self, path='figure_cache.sqlite', version='', max_entries=512, snapshot=None):
+        self.path = path
+        self.version = version
+        self.snapshot = snapshot
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        # Other workers may be writing, wait for them instead of failing with "database is locked"
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS figures (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                value BLOB NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS figures_accessed ON figures (accessed_at)")
+        # Figures of any other dataset version can never be asked for again
+        self._conn.execute("DELETE FROM figures WHERE version != ?", (self.current_version(),))
+        self._conn.commit()
+
+    def current_version(self):
+        if self.snapshot is not None:
+            return self.snapshot().stamp
+        return self.version() if callable(self.version) else self.version
+
+    def key(self, name, version, args):
+        state = json.dumps([name, version, args], cls=PlotlyJSONEncoder, sort_keys=True)
+        return hashlib.sha256(state.encode()).hexdigest()
+
+    # The cached value as plain JSON data (a figure comes back as its dict), or None on a miss
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, accessed_at FROM figures WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > TOUCH_INTERVAL:
+                self._conn.execute("UPDATE figures SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, version, value):
+        blob = zlib.compress(json.dumps(value, cls=PlotlyJSONEncoder).encode())
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO figures VALUES (?, ?, ?, ?)",
+                               (key, version, blob, time.time()))
+            size = self._conn.execute("SELECT COUNT(*) FROM figures").fetchone()[0]
+            excess = size - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM figures WHERE rowid IN (SELECT rowid FROM figures ORDER BY accessed_at LIMIT ?)",
+                    (excess,))
+                self.evicted += excess
+            self._conn.commit()
+
+    # Decorator for a callback whose result only depends on its arguments and the dataset version. With a
+    # `snapshot`, the function is called with the snapshot first, then the callback's arguments.
+    def memoize(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def cached(*args):
+                # Read once: the function may run while a newer version is swapped in, and its result
+                # must not be filed under that newer version
+                snapshot = self.snapshot() if self.snapshot is not None else None
+                version = snapshot.stamp if snapshot is not None else self.current_version()
+                key = self.key(name, version, args)
+                value = self.get(key)
+                if value is None:
+                    value = function(snapshot, *args) if snapshot is not None else function(*args)
+                    self.put(key, version, value)
+                return value
+            return cached
+        return decorate
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"Figure cache: {self.hits} hits, {self.misses} misses, {hit_rate:.1f}% hit rate, "
+                f"{self.evicted} evicted, {self.path}")
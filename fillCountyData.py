@@ -1,58 +1,219 @@
 # pip install pandas geopy
 
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut
 
-# Dictionary to cache city-state-county lookups
-# Should greatly speed up the process if you have many rows with the same city-state
-county_cache = {}
+import incremental
+from checkpoint import ProgressJournal, atomic_write_csv
+from instrumentation import metrics
+from offline_resolver import OfflineResolver
+from rate_limit import TokenBucket
 
-# Function to get the county using city and state
-def get_county(city, state):
-    global county_cache
-    key = (city, state)
+GAZETTEER_FILE = "county_gazetteer.jsonl"
+
+# One geocoder shared by every worker thread
+geolocator = Nominatim(user_agent="geo_lookup")
+
+
+# Lookups ignore case and stray whitespace so "WORCESTER" and "Worcester " are only geocoded once
+def pair_key_columns(df):
+    return pd.DataFrame({
+        "city_key": df["Origin City"].astype(str).str.strip().str.lower(),
+        "state_key": df["Origin State"].astype(str).str.strip().str.upper(),
+    }, index=df.index)
+
+
+# On-disk memory of every (city, state) -> county answer, kept between runs and shared by all inputs.
+# It is an append-only journal, so an interrupted run keeps everything it resolved.
+class CountyGazetteer:
+    def __init__(self, path=GAZETTEER_FILE):
+        self.journal = ProgressJournal(path, {"gazetteer": "city, state -> county", "version": 1})
+        self.counties = {(r["city"], r["state"]): r["county"] for r in self.journal.read()}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.counties
+
+    def __len__(self):
+        return len(self.counties)
 
-    # Check if the county is already cached
-    if key in county_cache:
-        return county_cache[key]
+    def add(self, key, county):
+        with self._lock:
+            self.counties[key] = county
+            self.journal.append({"city": key[0], "state": key[1], "county": county})
 
-    geolocator = Nominatim(user_agent="geo_lookup")
+    def close(self):
+        self.journal.close()
+
+    # Resolved pairs as a frame ready to be merged onto the package rows
+    # Workers keep adding while a flush reads, so the answers are copied under the lock first
+    def frame(self):
+        with self._lock:
+            items = list(self.counties.items())
+        found = [(city, state, county) for (city, state), county in items if county != "Not found"]
+        return pd.DataFrame(found, columns=["city_key", "state_key", "Resolved County"])
+
+
+# Function to get the county using city and state
+def get_county(city, state):
+    started = time.perf_counter()
     try:
         location = geolocator.geocode(f"{city}, {state}, USA", timeout=10)
+        metrics.observe("api_request_seconds", time.perf_counter() - started, service="nominatim", status="ok")
         if location and "county" in location.raw["display_name"].lower():
             parts = location.raw["display_name"].split(",")
             for part in parts:
                 if "County" in part:
-                    county_name = part.replace("County", "").strip()  # Remove "County"
-                    county_cache[key] = county_name  # Store in cache
-                    return county_name  # Return cleaned county name
-        county_cache[key] = "Not found"  # Cache result even if not found
+                    return part.replace("County", "").strip()  # Return cleaned county name
         return "Not found"
     except GeocoderTimedOut:
+        metrics.observe("api_request_seconds", time.perf_counter() - started, service="nominatim", status="timeout")
         return None  # Return None so we can retry later
 
-# Load the CSV file
-file_path = "Cleaned_Package_Data.csv"  # File checked for missing data, use written file to continue from last time
-export_path = "Cleaned_Package_Data_County.csv"  # File written to, can be same as origin file but I like preserving input data
-df = pd.read_csv(file_path)
 
-# Get total row count for tracking progress
-total_rows = len(df)
+# Blank strings (what tracking.py writes when Shippo has no origin) count as missing too
+def present(values):
+    return values.notna() & (values.astype(str).str.strip() != "")
+
+
+def missing_county_mask(df):
+    return ~present(df["Origin County"]) & present(df["Origin City"]) & present(df["Origin State"])
+
+
+# The distinct (city, state) pairs of rows that still need a county, with one spelling to query by
+def missing_pairs(df):
+    rows = df[missing_county_mask(df)]
+    keys = pair_key_columns(rows).drop_duplicates()
+    queries = rows.loc[keys.index, ["Origin City", "Origin State"]]
+    return list(zip(keys.itertuples(index=False, name=None), queries.itertuples(index=False, name=None)))
 
-# Process each row
-for index, row in df.iterrows():
-    if pd.isna(row["Origin County"]) and pd.notna(row["Origin City"]) and pd.notna(row["Origin State"]):
-        county = get_county(row["Origin City"], row["Origin State"])
 
-        # Only update if we found a valid county
-        if county and county != "Not found":
-            df.at[index, "Origin County"] = county
+# Geocode every pair the gazetteer does not know yet with a small worker pool sharing one rate limit.
+# Nominatim's usage policy allows about one request per second, hence the defaults.
+@metrics.timed()
+def resolve_pairs(pairs, gazetteer, workers=2, rate=1.0, retries=2, on_progress=None):
+    todo = [(key, query) for key, query in pairs if key not in gazetteer]
+    print(f"{len(pairs)} distinct city/state pairs need a county, {len(pairs) - len(todo)} already in the gazetteer.")
+    if not todo:
+        return
+    bucket = TokenBucket(rate)
+
+    def resolve(item):
+        key, (city, state) = item
+        for attempt in range(retries + 1):
+            waited = time.perf_counter()
+            bucket.acquire()
+            metrics.observe("api_wait_seconds", time.perf_counter() - waited, service="nominatim")
+            county = get_county(city, state)
+            if county is not None:
+                gazetteer.add(key, county)
+                return county
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for done, ((key, (city, state)), county) in enumerate(zip(todo, pool.map(resolve, todo)), 1):
+            status = county if county is not None else "timed out, will retry next run"
+            print(f"Resolved {city}, {state} -> {status} ({done} of {len(todo)})")
+            if on_progress:
+                on_progress(done)
+
+
+# Fill every missing Origin County from the gazetteer with one merge
+@metrics.timed()
+def apply_counties(df, gazetteer):
+    keys = pair_key_columns(df[missing_county_mask(df)])
+    resolved = keys.reset_index().merge(gazetteer.frame(), how="left", on=["city_key", "state_key"]).set_index("index")
+    resolved = resolved["Resolved County"].dropna()
+    df.loc[resolved.index, "Origin County"] = resolved
+    return len(resolved)
+
+
+@metrics.timed()
+def fill_counties(df, gazetteer, workers=2, rate=1.0, flush=None, flush_every=50, flush_seconds=60):
+    pairs = missing_pairs(df)
+    last_flush = [time.monotonic()]
+
+    # Periodically write what we have so far so the output is never far behind the gazetteer
+    def on_progress(done):
+        if flush and (done % flush_every == 0 or time.monotonic() - last_flush[0] >= flush_seconds):
+            apply_counties(df, gazetteer)
+            flush(df)
+            last_flush[0] = time.monotonic()
+
+    resolve_pairs(pairs, gazetteer, workers=workers, rate=rate, on_progress=on_progress)
+    filled = apply_counties(df, gazetteer)
+    print(f"Filled {filled} missing counties from {len(pairs)} city/state pairs.")
+    return df
+
+
+# No network needed: resolve missing counties from the bundled ZIP/city table in one pass
+@metrics.timed()
+def fill_counties_offline(df, resolver):
+    missing = missing_county_mask(df)
+    counties = resolver.county_name(resolver.resolve(df[missing])).dropna()
+    df.loc[counties.index, "Origin County"] = counties
+    print(f"Filled {len(counties)} of {int(missing.sum())} missing counties from the offline gazetteer.")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill in missing Origin County values with Nominatim.")
+    # File checked for missing data, use written file to continue from last time
+    parser.add_argument('--input', default="Cleaned_Package_Data.csv")
+    # File written to, can be same as origin file but I like preserving input data
+    parser.add_argument('--output', default="Cleaned_Package_Data_County.csv")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only geocode rows that are new or changed since the last --incremental run")
+    parser.add_argument('--gazetteer', default=GAZETTEER_FILE, help="Cache of resolved city/state pairs")
+    parser.add_argument('--offline', action='store_true',
+                        help="Use the bundled ZIP/city -> county table instead of Nominatim")
+    parser.add_argument('--workers', type=int, default=2, help="Concurrent geocoder requests")
+    parser.add_argument('--rate', type=float, default=1.0, help="Maximum geocoder requests per second")
+    parser.add_argument('--flush-every', type=int, default=50,
+                        help="Rewrite the output CSV after this many city/state pairs are resolved")
+    args = parser.parse_args()
+
+    gazetteer = None
+    if args.offline:
+        resolver = OfflineResolver()
+
+        def fill(frame, flush=None):
+            return fill_counties_offline(frame, resolver)
+    else:
+        gazetteer = CountyGazetteer(args.gazetteer)
+        print(f"Loaded {len(gazetteer)} known city/state pairs from {args.gazetteer}.")
+
+        def fill(frame, flush=None):
+            return fill_counties(frame, gazetteer, workers=args.workers, rate=args.rate,
+                                 flush=flush, flush_every=args.flush_every)
+
+    try:
+        if args.incremental:
+            full_df = incremental.read_csv_text(args.input)
+            plan = incremental.plan_delta(full_df, args.output)
+            # The delta is small, so it is written once at the end
+            df = fill(plan.delta(full_df).copy())
+            incremental.save_with_fingerprints(plan.assemble(df), plan, args.output)
+        else:
+            df = pd.read_csv(args.input)
+            incremental.discard_fingerprints(args.output)
+
+            def flush(frame):
+                atomic_write_csv(frame, args.output)
 
-            # Save progress after each update
-            df.to_csv(export_path, index=False)
+            fill(df, flush)
+            flush(df)
+    finally:
+        if gazetteer is not None:
+            gazetteer.close()
 
-            # Print progress with row count
-            print(f"Saved County: {county} for {row['Origin City']}, {row['Origin State']} (Row {index+1} of {total_rows})")
+    print("Missing counties have been filled and saved.")
 
-print("Missing counties have been filled and saved.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
-# pip install pandas addfips
+# pip install pandas numpy addfips
 
+import argparse
+
+import numpy as np
 import pandas as pd
 import addfips
 
+import incremental
+from instrumentation import metrics
+from offline_resolver import OfflineResolver, format_fips
+
 # Initialize addfips
 af = addfips.AddFIPS()
 
@@ -10,19 +17,69 @@ af = addfips.AddFIPS()
 input_file = "Cleaned_Package_Data_County.csv"  # Replace with your actual file name
 output_file = "Cleaned_Package_Data_County_FIPS.csv"
 
-# Read CSV into a DataFrame
-df = pd.read_csv(input_file)
-
 # Function to get FIPS code
 def get_fips(county, state):
     if pd.notna(state) and pd.notna(county):
         return af.get_county_fips(county.strip(), state=state.strip()) or "Unknown"
     return ""
 
-# Apply function to each row
-df["County FIPS"] = df.apply(lambda row: get_fips(row["Origin County"], row["Origin State"]), axis=1)
+# There are only a few hundred distinct counties, so every lookup works on the distinct
+# (county, state) pairs and broadcasts the answers back to the rows through the pair's category code
+def factorize_pairs(df):
+    counties = df["Origin County"].astype(str).str.strip().where(df["Origin County"].notna(), "")
+    states = df["Origin State"].astype(str).str.strip().where(df["Origin State"].notna(), "")
+    has_pair = (counties != "") & (states != "")
+    keys = (counties + "|" + states).where(has_pair)
+    codes, pairs = pd.factorize(keys)
+    counties, states = pairs.str.split("|", n=1).str[0], pairs.str.split("|", n=1).str[1]
+    print(f"Looking up {len(pairs)} distinct counties for {int(has_pair.sum())} rows.")
+    return codes, pd.Series(counties, dtype=object), pd.Series(states, dtype=object)
+
+def broadcast(codes, fips):
+    # Code -1 (no county or state) picks the trailing "" like get_fips does
+    return np.array(list(fips) + [""], dtype=object)[codes]
+
+@metrics.timed()
+def add_fips(df):
+    codes, counties, states = factorize_pairs(df)
+    df["County FIPS"] = broadcast(codes, [get_fips(county, state) for county, state in zip(counties, states)])
+    return df
+
+# Same result from the bundled gazetteer table instead of addfips
+@metrics.timed()
+def add_fips_offline(df, resolver):
+    codes, counties, states = factorize_pairs(df)
+    df["County FIPS"] = broadcast(codes, format_fips(resolver.county_fips(counties, states)).fillna("Unknown"))
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Add County FIPS codes for every Origin County.")
+    parser.add_argument('--input', default=input_file)
+    parser.add_argument('--output', default=output_file)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only look up rows that are new or changed since the last --incremental run")
+    parser.add_argument('--offline', action='store_true', help="Use the bundled gazetteer table instead of addfips")
+    args = parser.parse_args()
+
+    if args.offline:
+        resolver = OfflineResolver()
+        lookup = lambda frame: add_fips_offline(frame, resolver)
+    else:
+        lookup = add_fips
+
+    # Read CSV into a DataFrame
+    if args.incremental:
+        full_df = incremental.read_csv_text(args.input)
+        plan = incremental.plan_delta(full_df, args.output)
+        df = lookup(plan.delta(full_df).copy())
+        incremental.save_with_fingerprints(plan.assemble(df), plan, args.output)
+    else:
+        df = lookup(pd.read_csv(args.input))
+        # Save the updated DataFrame to a new CSV file
+        df.to_csv(args.output, index=False)
+        incremental.discard_fingerprints(args.output)
 
-# Save the updated DataFrame to a new CSV file
-df.to_csv(output_file, index=False)
+    print(f"Updated CSV with County FIPS saved as {args.output}")
 
-print(f"Updated CSV with County FIPS saved as {output_file}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
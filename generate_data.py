@@ -0,0 +1,247 @@
+# pip install pandas numpy
+#
+# Seeded synthetic mailroom exports for load and scale testing, in the exact schemas of packages.csv (the raw
+# export) and Cleaned_Package_Data_County_FIPS.csv (what the pipeline produces from it).
+#
+#   python generate_data.py --rows 100000                                  # both files, seed 0
+#   python generate_data.py --rows 10000000 --cleaned-output big.csv --raw-output ""
+#   python generate_data.py --rows 50000 --seed 7 --start 2024-01-01 --end 2024-12-31
+#
+# Everything is fitted from a real cleaned export (--profile). Each synthetic package copies a randomly
+# drawn real row's carrier, status, locker bank, mailbox, origin (city, state, ZIP, county, FIPS) and which of
+# its dates are known, so the carrier mix, bank distribution, origin cities and missing values follow the real
+# data jointly. Its times are new: the arrival day and hour come from the real weekday / hour-of-day pattern,
+# the delays are drawn from the real ones, and a pickup later than the same day lands on an hour drawn from the
+# real pickup pattern of its weekday. Locker numbers and tracking numbers (unique, in each carrier's format)
+# are generated too.
+#
+# Rows are generated and written in chunks, each from its own seed, so 10M rows need little memory and the
+# same --seed always gives the same files.
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from cleanPackageData import clean_packages, format_dates
+from package_store import read_text_csv, to_columnar
+
+PROFILE_FILE = "Cleaned_Package_Data_County_FIPS.csv"
+RAW_OUTPUT = "synthetic_packages.csv"
+CLEANED_OUTPUT = "synthetic_Cleaned_Package_Data_County_FIPS.csv"
+CHUNK_ROWS = 500_000
+
+RAW_COLUMNS = ["To", "Location 1", "Location 2", "Location 3", "From", "Notes", "Delivered Notes", "Locker Number",
+               "Locker Bank", "Carrier", "Tracking #", "Transaction Status ", "Routed by", "Routed Date Time",
+               "Stored Date Time", "Delivered by", "Delivered To", "Delivered Date Time", "Stored by"]
+CLEANED_COLUMNS = ["Location 1", "Locker Number", "Locker Bank", "Carrier", "Tracking #", "Transaction Status ",
+                   "Routed Date Time", "Stored Date Time", "Delivered Date Time", "Origin City", "Origin State",
+                   "Origin Zip", "Origin Country", "Bank_Locker", "Undergrad_Box", "Grad_Box",
+                   "Processing Time (Hours)", "Origin County", "County FIPS"]
+# Copied from the drawn real row
+TEMPLATE_COLUMNS = ["Location 1", "Locker Bank", "Carrier", "Transaction Status ", "Origin City", "Origin State",
+                    "Origin Zip", "Origin Country", "Origin County", "County FIPS"]
+
+# (prefix, digits) of the tracking numbers per carrier; others get the first letters of their name
+TRACKING_FORMATS = {"Amazon": ("TBA", 12), "USPS": ("9400", 18), "UPS": ("1Z", 16), "FedEx": ("", 12),
+                    "DHL": ("", 10), "Lasership": ("1LS", 12), "LaserShip": ("1LS", 12), "OnTrac": ("D", 14)}
+# Odd and not a multiple of 5, so row -> row * SERIAL_MULTIPLIER mod 10^digits never repeats
+SERIAL_MULTIPLIER = 982_451_653
+# Pickups at least this late are moved to an hour of the pickup pattern; quicker ones keep their exact delay
+SNAP_AFTER_MINUTES = 12 * 60
+MINUTES_PER_DAY = 24 * 60
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def _minutes(dates):
+    return dates.to_numpy(dtype="datetime64[m]").astype(np.int64)
+
+
+def _weekdays(days):
+    return (days + EPOCH_WEEKDAY) % 7
+
+
+# 7 x 24 cumulative hour-of-day distributions per weekday. Every hour keeps a little weight from the overall
+# pattern so a weekday with no data still gets sensible hours.
+def _hour_table(dates):
+    dates = dates.dropna()
+    counts = np.zeros((7, 24))
+    np.add.at(counts, (dates.dt.dayofweek.to_numpy(), dates.dt.hour.to_numpy()), 1)
+    overall = counts.sum(axis=0) + 1
+    counts += overall / overall.sum()
+    return np.cumsum(counts, axis=1) / counts.sum(axis=1, keepdims=True)
+
+
+def _pick_hours(rng, table, weekdays):
+    return (table[weekdays] < rng.random(len(weekdays))[:, None]).sum(axis=1).clip(0, 23)
+
+
+def _delays(hours):
+    minutes = np.round(hours.dropna().to_numpy() * 60).astype(np.int64)
+    return minutes if len(minutes) else np.zeros(1, dtype=np.int64)
+
+
+class MailroomProfile:
+    # Distributions of a real cleaned export
+    def __init__(self, path=PROFILE_FILE):
+        text = read_text_csv(path)
+        typed = to_columnar(text)
+        self.rows = len(text)
+        self.templates = text[TEMPLATE_COLUMNS].reset_index(drop=True)
+        self.known = {column: typed[column].notna().to_numpy()
+                      for column in ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]}
+
+        # Lockers per bank
+        self.capacity = typed.groupby("Locker Bank", observed=True)["Locker Number"].max().dropna().astype(int).to_dict()
+
+        # When packages arrive (routed, or stored when there is no routed time) and when they are picked up
+        arrival = typed["Routed Date Time"].fillna(typed["Stored Date Time"])
+        self.first_day, self.last_day = arrival.min().normalize(), arrival.max().normalize()
+        self.weekday_weights = np.bincount(arrival.dropna().dt.dayofweek, minlength=7) + 1.0
+        self.arrival_hours = _hour_table(arrival)
+        self.pickup_hours = _hour_table(typed["Delivered Date Time"])
+
+        # Delays in minutes, by which dates a package has
+        routed, stored, delivered = (typed[column] for column in
+                                     ["Routed Date Time", "Stored Date Time", "Delivered Date Time"])
+        self.routed_to_stored = _delays(typed["Routed → Stored"])
+        self.stored_to_delivered = _delays(typed["Stored → Delivered"])
+        desk = routed.notna() & stored.isna()
+        self.routed_to_delivered = _delays((delivered - routed)[desk].dt.total_seconds() / 3600)
+
+
+def tracking_numbers(carriers, rows, seed):
+    numbers = pd.Series("", index=carriers.index, dtype=object)
+    for carrier in carriers.dropna().unique():
+        prefix, digits = TRACKING_FORMATS.get(carrier, ("".join(filter(str.isalpha, carrier))[:3].upper(), 12))
+        mask = (carriers == carrier).to_numpy()
+        serials = (rows[mask] * SERIAL_MULTIPLIER + seed * 1_000_003 + 1) % 10 ** digits
+        numbers[mask] = prefix + pd.Series(serials).astype(str).str.zfill(digits).to_numpy()
+    return numbers
+
+
+# `count` packages, numbered from `first_row`, as a frame with datetime columns and the template columns
+def synthesize(profile, rng, first_row, count, first_day, last_day, seed):
+    template = rng.integers(profile.rows, size=count)
+    df = profile.templates.iloc[template].reset_index(drop=True)
+    routed_known, stored_known, delivered_known = (profile.known[column][template] for column in
+                                                   ["Routed Date Time", "Stored Date Time", "Delivered Date Time"])
+
+    # Arrival: a day weighted by its weekday, then an hour from that weekday's pattern
+    days = np.arange(_minutes(pd.Series([first_day]))[0] // MINUTES_PER_DAY,
+                     _minutes(pd.Series([last_day]))[0] // MINUTES_PER_DAY + 1)
+    weights = profile.weekday_weights[_weekdays(days)]
+    day = rng.choice(days, size=count, p=weights / weights.sum())
+    hour = _pick_hours(rng, profile.arrival_hours, _weekdays(day))
+    arrival = day * MINUTES_PER_DAY + hour * 60 + rng.integers(60, size=count)
+
+    # Stored some time after routing when a package has both, otherwise on arrival
+    lead = np.where(routed_known, rng.choice(profile.routed_to_stored, size=count), 0)
+    stored = arrival + lead
+    base = np.where(stored_known, stored, arrival)
+    delay = np.where(stored_known, rng.choice(profile.stored_to_delivered, size=count),
+                     rng.choice(profile.routed_to_delivered, size=count))
+    delivered = base + np.maximum(delay, 0)
+    # Later pickups happen at the pickup hours of their day
+    late = delay >= SNAP_AFTER_MINUTES
+    pickup_day = delivered[late] // MINUTES_PER_DAY
+    snapped = (pickup_day * MINUTES_PER_DAY + _pick_hours(rng, profile.pickup_hours, _weekdays(pickup_day)) * 60
+               + rng.integers(60, size=int(late.sum())))
+    delivered[late] = np.where(snapped < base[late], snapped + MINUTES_PER_DAY, snapped)
+
+    for column, minutes, known in [("Routed Date Time", arrival, routed_known),
+                                   ("Stored Date Time", stored, stored_known),
+                                   ("Delivered Date Time", delivered, delivered_known)]:
+        # int64 min is NaT
+        df[column] = np.where(known, minutes, np.iinfo(np.int64).min).astype("datetime64[m]").astype("datetime64[ns]")
+
+    capacity = df["Locker Bank"].map(profile.capacity).to_numpy(dtype=float)
+    lockers = np.floor(rng.random(count) * np.nan_to_num(capacity)) + 1
+    df["Locker Number"] = np.where(np.isnan(capacity), np.nan, lockers)
+    df["Tracking #"] = tracking_numbers(df["Carrier"], np.arange(first_row, first_row + count), seed)
+    return df
+
+
+# 2/14/25 12:15 like the mailroom export. Formatted once per distinct minute.
+def format_raw_dates(dates):
+    codes, distinct = pd.factorize(dates)
+    text = format_dates(pd.Series(distinct)).str.replace(r"/\d\d(\d\d) ", r"/\1 ", regex=True)
+    return pd.Series(np.append(text.to_numpy(dtype=object), np.nan)[codes], index=dates.index)
+
+
+def raw_frame(packages):
+    df = pd.DataFrame(index=packages.index, columns=RAW_COLUMNS, dtype=object)
+    for column in ["Location 1", "Locker Bank", "Carrier", "Transaction Status "]:
+        df[column] = packages[column]
+    # 35 as in packages.csv; only the cleaned export writes the 35.0 cleanPackageData.py makes of it
+    df["Locker Number"] = packages["Locker Number"].astype("Int64")
+    df["From"] = packages["Carrier"]
+    df["Tracking #"] = packages["Tracking #"] + "_"
+    for column in ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]:
+        df[column] = format_raw_dates(packages[column])
+    return df
+
+
+# What cleanPackageData.py makes of the raw rows, plus the origin, county and FIPS the enrichment would add
+def cleaned_frame(packages):
+    df = clean_packages(packages.assign(**{"Tracking #": packages["Tracking #"] + "_"}))
+    for column in ["Origin City", "Origin State", "Origin Zip", "Origin Country", "Origin County", "County FIPS"]:
+        df[column] = packages[column]
+    return df[CLEANED_COLUMNS]
+
+
+# Write `rows` packages to the given paths (None skips a schema); each file appears complete or not at all
+def generate(profile, rows, seed=0, raw_output=RAW_OUTPUT, cleaned_output=CLEANED_OUTPUT, first_day=None,
+             last_day=None, chunk_rows=CHUNK_ROWS):
+    first_day = pd.Timestamp(first_day) if first_day else profile.first_day
+    last_day = pd.Timestamp(last_day) if last_day else profile.last_day
+    outputs = {path: build for path, build in [(raw_output, raw_frame), (cleaned_output, cleaned_frame)] if path}
+    temp_files = {}
+    try:
+        for path in outputs:
+            fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                             dir=os.path.dirname(os.path.abspath(path)))
+            temp_files[path] = (temp_path, os.fdopen(fd, "w", newline="", encoding="utf-8"))
+        for chunk, first_row in enumerate(range(0, rows, chunk_rows)):
+            rng = np.random.default_rng([seed, chunk])
+            packages = synthesize(profile, rng, first_row, min(chunk_rows, rows - first_row), first_day, last_day,
+                                  seed)
+            for path, build in outputs.items():
+                build(packages).to_csv(temp_files[path][1], header=first_row == 0, index=False)
+        for path, (temp_path, temp_file) in temp_files.items():
+            temp_file.close()
+            os.replace(temp_path, path)
+    finally:
+        for temp_path, temp_file in temp_files.values():
+            temp_file.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return list(outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic mailroom exports.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", default=PROFILE_FILE, help="Real cleaned export the distributions come from")
+    parser.add_argument("--raw-output", default=RAW_OUTPUT, help='packages.csv schema ("" to skip)')
+    parser.add_argument("--cleaned-output", default=CLEANED_OUTPUT,
+                        help='Cleaned_Package_Data_County_FIPS.csv schema ("" to skip)')
+    parser.add_argument("--start", help="First arrival day (default: the profile's)")
+    parser.add_argument("--end", help="Last arrival day (default: the profile's)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    profile = MailroomProfile(args.profile)
+    paths = generate(profile, args.rows, args.seed, args.raw_output or None, args.cleaned_output or None,
+                     args.start, args.end, args.chunk_rows)
+    print(f"Wrote {args.rows:,} packages to {', '.join(paths)} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
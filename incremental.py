@@ -0,0 +1,103 @@
+# Helpers for the --incremental mode of tracking.py, fillCountyData.py and fillCountyFIPS.py.
+#
+# Every output CSV gets a sidecar "<output>.fingerprints.csv" with one line per output row holding the
+# row's tracking number and a hash of the *input* row it was made from. On the next run only input rows
+# whose (tracking number, hash) pair is not in the sidecar are enriched; everything else is copied from
+# the previous output, so the run time follows the size of the daily delta instead of the full history.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from checkpoint import atomic_write_csv
+
+FINGERPRINT_SUFFIX = '.fingerprints.csv'
+FINGERPRINT_COLUMNS = ['key', 'row_hash', 'seq']
+
+
+def fingerprint_path(output_path):
+    return output_path + FINGERPRINT_SUFFIX
+
+
+# Incremental runs read everything as text so unchanged rows hash (and are written back) identically
+def read_csv_text(path):
+    return pd.read_csv(path, dtype=str)
+
+
+def fingerprint_rows(df, key_column='Tracking #'):
+    keys = df[key_column].fillna('').astype(str).str.strip().str.rstrip('_')
+    fingerprints = pd.DataFrame({
+        'key': keys.to_numpy(),
+        'row_hash': pd.util.hash_pandas_object(df, index=False).to_numpy(),
+    })
+    # Tracking numbers are not unique (Excel turned some into 2.85E+11), so number repeated rows
+    fingerprints['seq'] = fingerprints.groupby(['key', 'row_hash']).cumcount()
+    return fingerprints
+
+
+class DeltaPlan:
+    def __init__(self, fingerprints, previous, previous_rows):
+        self.fingerprints = fingerprints
+        self.previous = previous
+        # Position of each input row in the previous output, or -1 if it has to be enriched
+        self.previous_rows = previous_rows
+        self.delta_mask = previous_rows < 0
+
+    def delta(self, df):
+        return df[self.delta_mask]
+
+    # Put the freshly enriched delta rows and the reused rows back together in input order
+    def assemble(self, enriched_delta):
+        reused = ~self.delta_mask
+        if not reused.any():
+            return enriched_delta.reset_index(drop=True)
+        kept = self.previous.iloc[self.previous_rows[reused]]
+        kept.index = np.flatnonzero(reused)
+        enriched_delta = enriched_delta.copy()
+        enriched_delta.index = np.flatnonzero(self.delta_mask)
+        combined = pd.concat([kept, enriched_delta]).sort_index()
+        columns = list(enriched_delta.columns) + [c for c in kept.columns if c not in enriched_delta.columns]
+        return combined[columns].reset_index(drop=True)
+
+
+# Work out which input rows are new or changed since the last run that wrote `output_path`
+def plan_delta(df, output_path, key_column='Tracking #'):
+    fingerprints = fingerprint_rows(df, key_column)
+    sidecar = fingerprint_path(output_path)
+    everything = DeltaPlan(fingerprints, None, np.full(len(df), -1))
+
+    if not (os.path.exists(output_path) and os.path.exists(sidecar)):
+        print(f"No fingerprints for {output_path} yet, enriching all {len(df)} rows.")
+        return everything
+    previous = read_csv_text(output_path)
+    previous_fingerprints = pd.read_csv(sidecar, dtype={'key': str, 'row_hash': 'uint64', 'seq': 'int64'},
+                                        keep_default_na=False)
+    if len(previous) != len(previous_fingerprints):
+        print(f"{sidecar} does not match {output_path}, enriching all {len(df)} rows.")
+        return everything
+
+    previous_fingerprints['previous_row'] = np.arange(len(previous_fingerprints))
+    matched = fingerprints.merge(previous_fingerprints, on=FINGERPRINT_COLUMNS, how='left')
+    previous_rows = matched['previous_row'].fillna(-1).astype(int).to_numpy()
+
+    plan = DeltaPlan(fingerprints, previous, previous_rows)
+    # "Changed" means the tracking number was seen before but its row contents differ
+    seen_rows = pd.MultiIndex.from_frame(previous_fingerprints[['key', 'row_hash']])
+    same_row = pd.MultiIndex.from_frame(fingerprints[['key', 'row_hash']]).isin(seen_rows)
+    changed = plan.delta_mask & fingerprints['key'].isin(previous_fingerprints['key']).to_numpy() & ~same_row
+    print(f"Incremental run: {int((~plan.delta_mask).sum())} rows unchanged, "
+          f"{int(plan.delta_mask.sum() - changed.sum())} new, {int(changed.sum())} changed.")
+    return plan
+
+
+def save_with_fingerprints(output, plan, output_path):
+    atomic_write_csv(output, output_path)
+    atomic_write_csv(plan.fingerprints[FINGERPRINT_COLUMNS], fingerprint_path(output_path))
+
+
+# A full run rewrites the output, so fingerprints from an older incremental run no longer apply
+def discard_fingerprints(output_path):
+    sidecar = fingerprint_path(output_path)
+    if os.path.exists(sidecar):
+        os.remove(sidecar)
@@ -0,0 +1,230 @@
+# Standard library only (plotly is imported to measure figure payloads, when there are any)
+#
+# Opt-in timings and sizes for the hot paths of the dashboard and the pipeline, to tell a slow CSV load from
+# date parsing, a cube re-sum, Plotly serialization or waiting on the Shippo / Nominatim APIs.
+#
+# Off unless PACKAGE_METRICS=1 is set (or `metrics.enable()` is called). While off, every hook is one flag
+# check and nothing is recorded. While on:
+#   span_seconds{span=...}                 time spent in each load / enrich stage (spans nest)
+#   callback_seconds{callback=...}         each Dash callback, cache hits included
+#   figure_serialize_seconds / figure_json_bytes{callback=...}
+#                                          encoding the callback's result to JSON and its size
+#   api_request_seconds{service, status}   each HTTP call to an external API; api_wait_seconds is the time
+#                                          spent waiting for the rate limiter before it
+#
+#   PACKAGE_METRICS=1 python Sankey_Diagram_Latest.py         # then GET http://127.0.0.1:8050/metrics
+#   python pipeline.py --raw packages.csv --metrics           # pipeline_metrics.json at the end of the run
+#
+# Histograms use fixed buckets, so recording is O(log buckets) and the memory is bounded by the number of
+# distinct label sets, not by the number of observations.
+
+import bisect
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+ENV_VAR = "PACKAGE_METRICS"
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+BYTES_BUCKETS = (1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7)
+SUMMARY_QUANTILES = (0.5, 0.95)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        # Upper bounds; the last count is for values above all of them
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _json_default(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # {name: {sorted label pairs: Histogram / number / callable}}
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        return self
+
+    def reset(self):
+        with self._lock:
+            self._histograms, self._counters, self._gauges = {}, {}, {}
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    # `value` may be a function, read whenever the metrics are exported (e.g. a cache's hit count)
+    def gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    @contextlib.contextmanager
+    def _span(self, name, labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_seconds", time.perf_counter() - started, span=name, **labels)
+
+    # with metrics.span("parse_dates"): ...
+    def span(self, name, **labels):
+        return self._span(name, labels) if self.enabled else contextlib.nullcontext()
+
+    # The function as a span of its own name (or `name`)
+    def timed(self, name=None, **labels):
+        def decorate(function):
+            span_name = name or function.__name__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self._span(span_name, labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # For Dash callbacks: times the call, then encodes the result the way Dash will to measure its size and
+    # how long that takes. The extra encoding is only done while metrics are on.
+    def callback(self, name):
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                if not self.enabled:
+                    return function(*args)
+                started = time.perf_counter()
+                result = function(*args)
+                self.observe("callback_seconds", time.perf_counter() - started, callback=name)
+                self.measure_payload(name, result)
+                return result
+            return wrapper
+        return decorate
+
+    def measure_payload(self, name, result):
+        from plotly.utils import PlotlyJSONEncoder
+
+        # dash.no_update sends nothing
+        if type(result).__name__ == "NoUpdate":
+            return
+        started = time.perf_counter()
+        payload = json.dumps(result, cls=PlotlyJSONEncoder)
+        self.observe("figure_serialize_seconds", time.perf_counter() - started, callback=name)
+        self.observe("figure_json_bytes", len(payload.encode()), buckets=BYTES_BUCKETS, callback=name)
+
+    def _snapshot(self):
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        gauges = {name: {key: value() if callable(value) else value for key, value in series.items()}
+                  for name, series in gauges.items()}
+        return histograms, counters, gauges
+
+    # Prometheus text exposition format (version 0.0.4)
+    def prometheus(self):
+        histograms, counters, gauges = self._snapshot()
+        lines = []
+        for name, series in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(key, [('le', f'{bound:g}')])} {cumulative}")
+                lines.append(f"{name}_bucket{_label_text(key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{_label_text(key)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_label_text(key)} {histogram.count}")
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for name, series in sorted(metrics.items()):
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_label_text(key)} {value:g}" for key, value in series.items())
+        return "\n".join(lines) + "\n"
+
+    # Plain numbers per metric and label set, for reports: count / total / mean / max and approximate
+    # quantiles (bucket upper bounds) of the histograms, all rounded to 6 decimals
+    def summary(self):
+        histograms, counters, gauges = self._snapshot()
+        result = {}
+        for name, series in sorted(histograms.items()):
+            result[name] = [{**dict(key), "count": histogram.count, "total": round(histogram.sum, 6),
+                             "mean": round(histogram.sum / histogram.count, 6), "max": round(histogram.max, 6),
+                             **{f"p{int(q * 100)}": round(histogram.quantile(q), 6) for q in SUMMARY_QUANTILES}}
+                            for key, histogram in series.items()]
+        for metrics in (counters, gauges):
+            for name, series in sorted(metrics.items()):
+                result[name] = [{**dict(key), "value": value} for key, value in series.items()]
+        return result
+
+    # The summary (plus any `extra` top level entries) as JSON, through a temp file + rename
+    def write_summary(self, path, **extra):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                json.dump({**extra, "metrics": self.summary()}, temp_file, indent=2, default=_json_default)
+                temp_file.write("\n")
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+# The one registry every module records into
+metrics = Metrics(enabled=os.environ.get(ENV_VAR, "") not in ("", "0"))
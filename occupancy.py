@@ -0,0 +1,169 @@
+# pip install pandas numpy
+#
+# How many lockers of each bank are occupied at any moment, for capacity planning.
+#
+# Every package with a stored and a delivered time occupies a locker over [stored, delivered). The intervals
+# are turned into one event stream (+1 when stored, -1 when picked up), sorted once by bank and time, and a
+# cumulative sum over it gives the occupancy right after every event. Sorting makes it O(n log n); nothing
+# ever scans the packages per timestamp. Pickups sort before stores at the same minute, so a locker emptied
+# and refilled at once is not counted twice.
+#
+# Capacity defaults to the number of distinct Locker Numbers seen in each bank.
+#
+#   python occupancy.py                            # per-bank peak / p50 / p95 / time at capacity
+#   python occupancy.py --start 2024-09-01 --end 2024-12-31
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from package_cubes import with_unknown
+from package_store import load_packages
+
+MAX_POINTS = 400
+PERCENTILES = [50, 95, 99]
+NANOSECONDS_PER_HOUR = 3600 * 10 ** 9
+
+
+def _nanoseconds(values):
+    return values.to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+def _timestamp(value, default):
+    return default if value is None else pd.Timestamp(value).value
+
+
+class BankSeries:
+    def __init__(self, times, occupancy):
+        # Event times (int64 ns, unique and sorted) and the occupancy from each one until the next
+        self.times = times
+        self.occupancy = occupancy
+
+    # Step segments inside [start, end): (segment start, segment end, occupancy)
+    def segments(self, start, end):
+        if start >= end:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        first = np.searchsorted(self.times, start, side="right") - 1
+        last = np.searchsorted(self.times, end, side="left")
+        begins = self.times[max(first, 0):last]
+        values = self.occupancy[max(first, 0):last]
+        if first < 0:
+            # Before its first event the bank was empty
+            begins, values = np.insert(begins, 0, start), np.insert(values, 0, 0)
+        begins = np.maximum(begins, start)
+        ends = np.append(begins[1:], end)
+        return begins, ends, values
+
+
+class LockerOccupancy:
+    # capacity: {bank: lockers}; by default the distinct Locker Numbers per bank.
+    # include_open: count packages that were stored but never picked up as occupying until the last event.
+    def __init__(self, df, capacity=None, include_open=False):
+        stored = df["Stored Date Time"]
+        delivered = df["Delivered Date Time"]
+        closed = stored.notna() & delivered.notna() & (delivered >= stored)
+        keep = closed | (stored.notna() & delivered.isna()) if include_open else closed
+        df = df[keep]
+        banks = with_unknown(df["Locker Bank"]).cat.remove_unused_categories()
+        self.banks = [str(bank) for bank in banks.cat.categories]
+        starts = _nanoseconds(df["Stored Date Time"])
+        known_ends = _nanoseconds(df["Delivered Date Time"].dropna())
+        self.first = int(starts.min()) if len(starts) else 0
+        self.last = int(max(starts.max(), known_ends.max(initial=0))) if len(starts) else 0
+        # An open interval ends with the data
+        ends = _nanoseconds(df["Delivered Date Time"].fillna(pd.Timestamp(self.last)))
+        codes = banks.cat.codes.to_numpy()
+
+        # The sweep: one sorted event stream for all banks. Every interval closes, so each bank's events sum
+        # to zero and a single cumulative sum gives every bank's occupancy.
+        times = np.concatenate([starts, ends])
+        deltas = np.concatenate([np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)])
+        bank_codes = np.concatenate([codes, codes])
+        order = np.lexsort((deltas, times, bank_codes))
+        times, deltas, bank_codes = times[order], deltas[order], bank_codes[order]
+        occupancy = np.cumsum(deltas)
+
+        # Only the last event at a (bank, time) is the occupancy from then on
+        last_of_time = np.ones(len(times), dtype=bool)
+        last_of_time[:-1] = (times[1:] != times[:-1]) | (bank_codes[1:] != bank_codes[:-1])
+        times, occupancy, bank_codes = times[last_of_time], occupancy[last_of_time], bank_codes[last_of_time]
+
+        self.series = {}
+        bounds = np.searchsorted(bank_codes, np.arange(len(self.banks) + 1))
+        for code, bank in enumerate(self.banks):
+            bank_times, bank_occupancy = times[bounds[code]:bounds[code + 1]], occupancy[bounds[code]:bounds[code + 1]]
+            bank_times.flags.writeable = False
+            bank_occupancy.flags.writeable = False
+            self.series[bank] = BankSeries(bank_times, bank_occupancy)
+
+        if capacity is None:
+            lockers = df.groupby(banks, observed=True)["Locker Number"].nunique()
+            capacity = {str(bank): int(count) for bank, count in lockers.items() if count > 0}
+        self.capacity = capacity
+
+    def range(self):
+        return pd.Timestamp(self.first), pd.Timestamp(self.last)
+
+    # Per-bank peak, time-weighted percentiles and hours at capacity between start and end (None = open ended)
+    def stats(self, start=None, end=None, banks=None, percentiles=PERCENTILES):
+        start, end = _timestamp(start, self.first), _timestamp(end, self.last)
+        rows = []
+        for bank in banks or self.banks:
+            if bank not in self.series:
+                continue
+            begins, ends, values = self.series[bank].segments(start, end)
+            durations = ends - begins
+            row = {"Locker Bank": bank, "Capacity": self.capacity.get(bank),
+                   "Peak": int(values.max()) if len(values) else 0}
+            if len(values) and durations.sum() > 0:
+                # Time-weighted: the occupancy the bank was at or below for p% of the time
+                order = np.argsort(values, kind="stable")
+                share = np.cumsum(durations[order]) / durations.sum()
+                for p in percentiles:
+                    row[f"P{p}"] = int(values[order][min(np.searchsorted(share, p / 100), len(order) - 1)])
+                row["Mean"] = float((values * durations).sum() / durations.sum())
+            else:
+                row.update({f"P{p}": 0 for p in percentiles}, Mean=0.0)
+            capacity = self.capacity.get(bank)
+            full = durations[values >= capacity].sum() if capacity else 0
+            row["Hours at capacity"] = full / NANOSECONDS_PER_HOUR
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    # Occupancy of one bank for a chart: the exact steps when there are few, otherwise the peak per bucket
+    # (what capacity planning needs) for max_points equal-width buckets
+    def points(self, bank, start=None, end=None, max_points=MAX_POINTS):
+        start, end = _timestamp(start, self.first), _timestamp(end, self.last)
+        begins, _, values = self.series[bank].segments(start, end)
+        if len(begins) <= max_points:
+            return pd.DataFrame({"time": pd.to_datetime(begins), "occupancy": values})
+
+        edges = np.linspace(start, end, max_points + 1).astype(np.int64)
+        # Each bucket's peak: the occupancy carried in from before it, or any step inside it
+        first = np.searchsorted(begins, edges[:-1], side="right") - 1
+        carried = values[np.maximum(first, 0)]
+        inside = np.searchsorted(begins, edges[:-1], side="left")
+        nonempty = inside < np.searchsorted(begins, edges[1:], side="left")
+        peaks = carried.copy()
+        if nonempty.any():
+            maxima = np.maximum.reduceat(values, inside[nonempty])
+            peaks[nonempty] = np.maximum(carried[nonempty], maxima)
+        return pd.DataFrame({"time": pd.to_datetime(edges[:-1]), "occupancy": peaks})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Locker occupancy per bank from stored / delivered times.")
+    parser.add_argument("--input", default="Cleaned_Package_Data_County_FIPS.csv")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--include-open", action="store_true",
+                        help="Count packages never picked up as occupying until the end of the data")
+    args = parser.parse_args()
+
+    occupancy = LockerOccupancy(load_packages(args.input), include_open=args.include_open)
+    print(occupancy.stats(args.start, args.end).to_string(index=False, float_format="{:.1f}".format))
+
+
+if __name__ == "__main__":
+    main()
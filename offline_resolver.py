@@ -0,0 +1,128 @@
+# pip install pandas numpy
+#
+# Offline Origin Zip / Origin City -> county -> FIPS resolution backed by the bundled
+# us_zip_county_gazetteer.csv.gz (see build_gazetteer.py), for runs without network access.
+# The table is loaded once into compact indexes and every lookup is a vectorized join over the frame:
+#   - ZIP codes: sorted int32 array searched with np.searchsorted
+#   - "city|state" and "county|state": hashed pandas Index lookups
+# City names that do not match exactly get a fuzzy match against the cities of the same state,
+# done once per distinct misspelling.
+
+import difflib
+import os
+
+import numpy as np
+import pandas as pd
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "us_zip_county_gazetteer.csv.gz")
+
+# Spelling variants that should compare equal ("St. Louis" / "Saint Louis", "Ft Worth" / "Fort Worth")
+NAME_REPLACEMENTS = [
+    (r"[.'’]", ""), (r"[-/]", " "), (r"\bsaint\b", "st"), (r"\bsainte\b", "ste"),
+    (r"\bfort\b", "ft"), (r"\bmount\b", "mt"), (r"\s+", " "),
+]
+COUNTY_SUFFIXES = r"\s+(county|parish|borough|census area|municipality|municipio|city and borough|city)$"
+
+
+def normalize_names(names):
+    names = names.fillna("").astype(str).str.lower().str.strip()
+    for pattern, replacement in NAME_REPLACEMENTS:
+        names = names.str.replace(pattern, replacement, regex=True)
+    return names.str.strip()
+
+
+def normalize_states(states):
+    return states.fillna("").astype(str).str.strip().str.upper()
+
+
+def county_name_keys(counties):
+    return normalize_names(normalize_names(counties).str.replace(COUNTY_SUFFIXES, "", regex=True))
+
+
+# "01609-1234", "1609.0" (leading zero eaten by read_csv) and "01609" all become 1609
+def zip_numbers(zips):
+    digits = zips.fillna("").astype(str).str.strip().str.replace(r"\.0$", "", regex=True).str.split("-").str[0]
+    return pd.to_numeric(digits.where(digits.str.fullmatch(r"\d{3,5}")), errors="coerce")
+
+
+class OfflineResolver:
+    def __init__(self, path=GAZETTEER_FILE, fuzzy_cutoff=0.85):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        table = pd.read_csv(path, dtype=str, keep_default_na=False)
+        fips = table["fips"].astype(np.int32)
+
+        # fips code -> county name
+        counties = pd.DataFrame({"fips": fips, "county": table["county"], "state": table["state"]}).drop_duplicates("fips")
+        self.county_names = pd.Series(counties["county"].to_numpy(), index=counties["fips"].to_numpy())
+
+        # Every row of a ZIP code has the same county, so keep one per ZIP
+        zips = pd.DataFrame({"zip": pd.to_numeric(table["zip"], errors="coerce"), "fips": fips}).dropna()
+        zips = zips.drop_duplicates("zip").sort_values("zip")
+        self._zip_keys = zips["zip"].to_numpy(np.int32)
+        self._zip_fips = zips["fips"].to_numpy(np.int32)
+
+        # A city can span several counties; pick the one covering the most ZIP codes
+        cities = pd.DataFrame({"city": normalize_names(table["city"]), "state": table["state"], "fips": fips})
+        cities = (cities.groupby(["city", "state", "fips"]).size().rename("zips").reset_index()
+                  .sort_values("zips", ascending=False).drop_duplicates(["city", "state"]))
+        self._city_fips = pd.Series(cities["fips"].to_numpy(), index=cities["city"] + "|" + cities["state"])
+        self._cities_by_state = cities.groupby("state")["city"].apply(list).to_dict()
+
+        # Index counties by their full name first so "Baltimore city" and "Baltimore County" stay apart,
+        # then by the name without its suffix, which is how fillCountyData.py stores them
+        full_keys = normalize_names(counties["county"]) + "|" + counties["state"]
+        short_keys = county_name_keys(counties["county"]) + "|" + counties["state"]
+        self._county_fips = pd.Series(np.concatenate([counties["fips"].to_numpy()] * 2),
+                                      index=np.concatenate([full_keys.to_numpy(), short_keys.to_numpy()]))
+        self._county_fips = self._county_fips[~self._county_fips.index.duplicated()]
+
+    # ZIP -> fips (NaN where unknown)
+    def zip_fips(self, zips):
+        numbers = zip_numbers(zips).to_numpy()
+        known = ~np.isnan(numbers)
+        positions = np.searchsorted(self._zip_keys, numbers[known].astype(np.int32))
+        positions = np.minimum(positions, len(self._zip_keys) - 1)
+        hits = self._zip_keys[positions] == numbers[known].astype(np.int32)
+        result = np.full(len(numbers), np.nan)
+        result[np.flatnonzero(known)[hits]] = self._zip_fips[positions[hits]]
+        return pd.Series(result, index=zips.index)
+
+    # City + state -> fips, with a fuzzy fallback for names not in the table
+    def city_fips(self, cities, states):
+        keys = pd.Series(normalize_names(cities).to_numpy() + "|" + normalize_states(states).to_numpy(), index=cities.index)
+        result = self._city_fips.reindex(keys.to_numpy()).to_numpy(dtype=float)
+
+        misses = pd.unique(keys[np.isnan(result) & (cities.notna() & states.notna()).to_numpy()])
+        corrections = {}
+        for key in misses:
+            city, state = key.rsplit("|", 1)
+            match = difflib.get_close_matches(city, self._cities_by_state.get(state, []), n=1, cutoff=self.fuzzy_cutoff)
+            if match:
+                corrections[key] = self._city_fips[f"{match[0]}|{state}"]
+        if corrections:
+            fixed = keys.map(corrections).to_numpy(dtype=float)
+            result = np.where(np.isnan(result), fixed, result)
+        return pd.Series(result, index=cities.index)
+
+    # County name + state -> fips
+    def county_fips(self, counties, states):
+        states = normalize_states(states).to_numpy()
+        result = self._county_fips.reindex(normalize_names(counties).to_numpy() + "|" + states).to_numpy(dtype=float)
+        short = self._county_fips.reindex(county_name_keys(counties).to_numpy() + "|" + states).to_numpy(dtype=float)
+        return pd.Series(np.where(np.isnan(result), short, result), index=counties.index)
+
+    # Resolve every row's county from its ZIP code, falling back to its city
+    def resolve(self, df):
+        fips = self.zip_fips(df["Origin Zip"]) if "Origin Zip" in df.columns else pd.Series(np.nan, index=df.index)
+        missing = fips.isna()
+        if missing.any():
+            fips[missing] = self.city_fips(df.loc[missing, "Origin City"], df.loc[missing, "Origin State"])
+        return fips
+
+    def county_name(self, fips):
+        return pd.Series(self.county_names.reindex(fips.to_numpy()).to_numpy(), index=fips.index)
+
+
+def format_fips(fips):
+    return fips.map(lambda code: f"{int(code):05d}" if pd.notna(code) else np.nan)
+
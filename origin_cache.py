@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+
+# Cache keys ignore case, surrounding whitespace and the trailing '_' the mailroom export adds
+def normalize_key(carrier, tracking_number):
+    return str(carrier).strip().lower(), str(tracking_number).strip().rstrip('_').upper()
+
+
+# Durable (carrier, tracking number) -> origin address cache kept in a SQLite file between runs.
+# Lookups that came back without an origin are stored as negative entries with a shorter TTL,
+# since the carrier may not have scanned the package yet. Once the cache holds more than
+# `max_entries` rows the least recently used ones are evicted.
+class OriginCache:
+    def __init__(self, path='origin_cache.sqlite', ttl_days=180, negative_ttl_days=2,
+                 max_entries=500_000, commit_every=200):
+        self.path = path
+        self.ttl = ttl_days * DAY
+        self.negative_ttl = negative_ttl_days * DAY
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS origins (
+                carrier TEXT NOT NULL,
+                tracking_number TEXT NOT NULL,
+                city TEXT, state TEXT, zip TEXT, country TEXT,
+                found INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (carrier, tracking_number)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS origins_accessed ON origins (accessed_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM origins").fetchone()[0]
+
+    def __len__(self):
+        return self._size
+
+    # Returns the cached address tuple (empty strings for a negative entry) or None on a miss
+    def get(self, carrier, tracking_number):
+        key = normalize_key(carrier, tracking_number)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT city, state, zip, country, found, fetched_at FROM origins WHERE carrier = ? AND tracking_number = ?",
+                key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            found, fetched_at = row[4], row[5]
+            if now - fetched_at > (self.ttl if found else self.negative_ttl):
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE origins SET accessed_at = ? WHERE carrier = ? AND tracking_number = ?",
+                               (now, *key))
+            self._mark_dirty()
+            self.hits += 1
+            if not found:
+                self.negative_hits += 1
+            return tuple(value or '' for value in row[:4])
+
+    # Store a lookup result; pass address=None when the API answered but had no origin
+    def put(self, carrier, tracking_number, address):
+        key = normalize_key(carrier, tracking_number)
+        now = time.time()
+        city, state, zip_code, country = address or ('', '', '', '')
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM origins WHERE carrier = ? AND tracking_number = ?", key).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO origins VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, city, state, zip_code, country, int(address is not None), now, now))
+            if not exists:
+                self._size += 1
+            self._mark_dirty()
+            # Evict in chunks so we are not deleting on every insert once the cache is full
+            if self._size > self.max_entries * 1.05:
+                self._evict()
+
+    def _mark_dirty(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self._conn.commit()
+            self._pending = 0
+
+    def _evict(self):
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM origins").fetchone()[0]
+        excess = self._size - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM origins WHERE rowid IN (SELECT rowid FROM origins ORDER BY accessed_at LIMIT ?)",
+                (excess,))
+            self._conn.commit()
+            self.evicted += excess
+            self._size -= excess
+
+    def close(self):
+        with self._lock:
+            if self._size > self.max_entries:
+                self._evict()
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"Origin cache: {self.hits} hits ({self.negative_hits} negative), {self.misses} misses "
+                f"({self.expired} expired), {hit_rate:.1f}% hit rate, {self.evicted} evicted, "
+                f"{self._size} entries in {self.path}")
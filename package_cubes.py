@@ -0,0 +1,130 @@
+# pip install pandas numpy
+#
+# Pre-aggregated "cube" of the package data for the dashboard filters.
+#
+# The rows are grouped once at load time into cells of
+#   routed day x pickup weekday x pickup hour x carrier x locker bank x origin state x processing-time bin
+# holding counts and sums. A filter (date range, carriers, banks, states) only has to mask and re-sum those
+# cells, so its cost follows the number of distinct cells rather than the number of packages.
+
+import numpy as np
+import pandas as pd
+
+DIMENSIONS = ["day", "weekday", "hour", "Carrier", "Locker Bank", "Origin State", "bin"]
+FILTER_COLUMNS = ["Carrier", "Locker Bank", "Origin State"]
+UNKNOWN = "Unknown"
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def with_unknown(values):
+    values = values.astype("category")
+    if UNKNOWN not in values.cat.categories:
+        values = values.cat.add_categories(UNKNOWN)
+    return values.fillna(UNKNOWN)
+
+
+class PackageCube:
+    # df needs the typed date columns and duration columns from package_store.load_packages
+    def __init__(self, df, bins=50):
+        total = df["Total Processing Time"]
+        low, high = total.min(), total.max()
+        if not np.isfinite(low) or high <= low:
+            low, high = (0.0, 1.0) if not np.isfinite(low) else (low, low + 1.0)
+        # Same equal-width bins for every filter so histograms stay comparable
+        self.bin_edges = np.linspace(low, high, bins + 1)
+        bin_index = np.clip(np.searchsorted(self.bin_edges, total, side="right") - 1, 0, bins - 1)
+
+        keys = pd.DataFrame({
+            "day": df["Routed Date Time"].dt.normalize(),
+            "weekday": df["Delivered Date Time"].dt.dayofweek,
+            "hour": df["Delivered Date Time"].dt.hour,
+            **{column: with_unknown(df[column]) for column in FILTER_COLUMNS},
+            "bin": bin_index,
+            "total": total,
+            "routed_stored": df["Routed → Stored"],
+            "stored_delivered": df["Stored → Delivered"],
+        }, index=df.index)
+        grouped = keys.groupby(DIMENSIONS, observed=True, dropna=False)
+        self.cells = grouped.agg(
+            count=("total", "size"),
+            total=("total", "sum"),
+            routed_stored=("routed_stored", "sum"),
+            routed_stored_count=("routed_stored", "count"),
+            stored_delivered=("stored_delivered", "sum"),
+            stored_delivered_count=("stored_delivered", "count"),
+        ).reset_index()
+        self.rows = len(df)
+        # The unfiltered view (and its pickup matrix) is what most page loads ask for, so it is built up front
+        self.everything = CubeSlice(self.cells, self.bin_edges)
+
+    # Values to offer in the filter controls
+    def options(self, column):
+        counts = self.cells.groupby(column, observed=True)["count"].sum().sort_values(ascending=False)
+        return [str(value) for value in counts.index]
+
+    def date_range(self):
+        return self.cells["day"].min(), self.cells["day"].max()
+
+    # Cells matching the filters; None or an empty selection means "everything"
+    def select(self, start=None, end=None, carriers=None, banks=None, states=None):
+        if start is None and end is None and not (carriers or banks or states):
+            return self.everything
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= (cells["day"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (cells["day"] <= pd.Timestamp(end)).to_numpy()
+        for column, chosen in zip(FILTER_COLUMNS, (carriers, banks, states)):
+            if chosen:
+                mask &= cells[column].isin(chosen).to_numpy()
+        return CubeSlice(cells[mask], self.bin_edges)
+
+
+# What the charts need, summed from the selected cells
+class CubeSlice:
+    def __init__(self, cells, bin_edges):
+        self.cells = cells
+        self.bin_edges = bin_edges
+        self._pickup_matrix = pickup_matrix(cells)
+
+    def __len__(self):
+        return int(self.cells["count"].sum())
+
+    def carrier_counts(self):
+        counts = self.cells.groupby("Carrier", observed=True)["count"].sum()
+        counts = counts[counts > 0].sort_values(ascending=False, kind="stable")
+        return counts.rename_axis("Carrier").reset_index(name="Count")
+
+    def top_carrier(self):
+        counts = self.carrier_counts()
+        return counts["Carrier"].iloc[0] if len(counts) else "-"
+
+    def mean_total(self):
+        count = self.cells["count"].sum()
+        return self.cells["total"].sum() / count if count else float("nan")
+
+    # Mean hours spent routed -> stored and stored -> delivered
+    def stage_means(self):
+        sums = self.cells[["routed_stored", "routed_stored_count", "stored_delivered", "stored_delivered_count"]].sum()
+        return (sums["routed_stored"] / sums["routed_stored_count"] if sums["routed_stored_count"] else 0.0,
+                sums["stored_delivered"] / sums["stored_delivered_count"] if sums["stored_delivered_count"] else 0.0)
+
+    # Packages per processing-time bin, with the bin's edges
+    def histogram(self):
+        counts = self.cells.groupby("bin")["count"].sum().reindex(range(len(self.bin_edges) - 1), fill_value=0)
+        return pd.DataFrame({"start": self.bin_edges[:-1], "end": self.bin_edges[1:], "Count": counts.to_numpy()})
+
+    # Pickups per weekday (rows, Monday first) x hour of the delivered time (columns). Built once per slice
+    # and read-only, so concurrent callbacks can share it without copying or locking.
+    def pickup_matrix(self):
+        return self._pickup_matrix
+
+
+def pickup_matrix(cells):
+    known = cells["weekday"].notna() & cells["hour"].notna()
+    matrix = np.zeros((len(WEEKDAYS), 24), dtype=np.int64)
+    np.add.at(matrix, (cells["weekday"][known].to_numpy(dtype=int), cells["hour"][known].to_numpy(dtype=int)),
+              cells["count"][known].to_numpy())
+    matrix.flags.writeable = False
+    return matrix
@@ -0,0 +1,213 @@
+# pip install pandas pyarrow
+#
+# Typed, columnar copy of a cleaned package CSV for the dashboards.
+#
+# Next to every published CSV the pipeline writes an uncompressed Arrow IPC (Feather v2) file with real
+# datetime64 date columns, the derived durations in hours, categorical carrier/bank/state columns and integer
+# FIPS codes. This is the one place package data is loaded, typed and derived; every script and dashboard goes
+# through load_packages(), which memory-maps that file instead of re-parsing the text CSV and its dates:
+#
+#   df = load_packages("Cleaned_Package_Data_County_FIPS.csv")   # reads ...County_FIPS.feather if it is current
+#
+#   python package_store.py Cleaned_Package_Data.csv Cleaned_Package_Data_County_FIPS.csv   # convert existing CSVs
+
+import argparse
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+
+from instrumentation import metrics
+
+COLUMNAR_SUFFIX = ".feather"
+
+DATE_COLUMNS = ["Routed Date Time", "Stored Date Time", "Delivered Date Time"]
+CATEGORY_COLUMNS = ["Carrier", "Locker Bank", "Origin State", "Origin Country", "Transaction Status "]
+FLOAT_COLUMNS = ["Locker Number", "Processing Time (Hours)"]
+# Identifiers that look numeric but must keep their text (leading zeros, "G..." boxes, 2.85E+11 tracking numbers)
+TEXT_COLUMNS = ["Tracking #", "Location 1", "Origin Zip", "Undergrad_Box", "Grad_Box", "County FIPS"]
+
+# Date layouts of the files we know about, tried in order: cleaned CSVs write m/d/YYYY H:MM, raw mailroom
+# exports (packages.csv) m/d/YY H:MM. Anything else ("Unknown", blanks) becomes NaT.
+CLEANED_DATE_FORMAT = "%m/%d/%Y %H:%M"
+RAW_DATE_FORMAT = "%m/%d/%y %H:%M"
+KNOWN_DATE_FORMATS = [CLEANED_DATE_FORMAT, RAW_DATE_FORMAT]
+MISSING_DATES = {"", "Unknown"}
+
+# Hours between two of the date columns, computed once when the frame is typed
+DURATION_COLUMNS = {
+    "Routed → Stored": ("Routed Date Time", "Stored Date Time"),
+    "Stored → Delivered": ("Stored Date Time", "Delivered Date Time"),
+    "Total Processing Time": ("Routed Date Time", "Delivered Date Time"),
+}
+
+# Schema metadata key recording which CSV (size and mtime) a columnar file was made from
+SOURCE_KEY = b"source_csv"
+# Bump when the typed layout changes so older columnar files are rebuilt rather than trusted
+LAYOUT_VERSION = 2
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+
+def source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return f"{LAYOUT_VERSION}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+
+
+# The first known format that parses a sample of the distinct values, or None if none of them does
+def infer_date_format(distinct):
+    sample = pd.Series(distinct, dtype=object).dropna()[:1000]
+    for date_format in KNOWN_DATE_FORMATS:
+        if pd.to_datetime(sample, format=date_format, errors="coerce").notna().all():
+            return date_format
+    return None
+
+
+# Vectorized date parsing. Exports repeat the same minute many times over, so only the distinct strings are
+# parsed (with the inferred format; a slow "mixed" pass only for strings that do not fit it) and the answers
+# are mapped back onto the rows.
+@metrics.timed()
+def parse_dates(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.astype("string").str.strip()
+    codes, distinct = pd.factorize(text.where(~text.isin(MISSING_DATES)))
+    distinct = pd.Series(distinct, dtype=object)
+    date_format = infer_date_format(distinct)
+    if date_format is None:
+        parsed = pd.to_datetime(distinct, format="mixed", errors="coerce")
+    else:
+        parsed = pd.to_datetime(distinct, format=date_format, errors="coerce")
+        retry = parsed.isna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(distinct[retry], format="mixed", errors="coerce")
+    # Code -1 (missing) picks the trailing NaT
+    dates = pd.concat([parsed, pd.Series([pd.NaT], dtype=parsed.dtype)], ignore_index=True).to_numpy()[codes]
+    return pd.Series(dates, index=values.index, name=values.name)
+
+
+def add_durations(df):
+    for name, (start, end) in DURATION_COLUMNS.items():
+        if start in df.columns and end in df.columns:
+            df[name] = (df[end] - df[start]).dt.total_seconds() / 3600
+    return df
+
+
+# Convert a cleaned frame (as text, or as read_csv guessed it) to the typed layout
+@metrics.timed()
+def to_columnar(df):
+    df = df.copy()
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = parse_dates(df[column])
+    add_durations(df)
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in FLOAT_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("float64")
+    if "County FIPS" in df.columns:
+        # "Unknown" (lookup failed) and "" (no county) both become missing
+        df["County FIPS"] = pd.to_numeric(df["County FIPS"], errors="coerce").astype("Int32")
+    for column in TEXT_COLUMNS:
+        if column in df.columns and column != "County FIPS":
+            df[column] = df[column].astype("string")
+    return df
+
+
+@metrics.timed()
+def read_text_csv(csv_path):
+    return pd.read_csv(csv_path, dtype={column: str for column in TEXT_COLUMNS})
+
+
+# Typed frames stacked into one, e.g. a loaded file and the rows appended to it since. Nothing is re-parsed:
+# only the categorical columns are merged, so their categories stay the sorted union as to_columnar makes them.
+def concat_columnar(frames):
+    df = pd.concat(frames, ignore_index=True)
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = union_categoricals([frame[column] for frame in frames], sort_categories=True)
+    return df
+
+
+# Write the typed frame uncompressed so readers can memory-map it; same temp file + rename as atomic_write_csv
+def write_columnar(df, path, source_csv=None):
+    table = pa.Table.from_pandas(to_columnar(df), preserve_index=False)
+    if source_csv is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), SOURCE_KEY: source_stamp(source_csv)})
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        feather.write_feather(table, temp_path, compression="uncompressed")
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@metrics.timed()
+def read_columnar(path, columns=None):
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    # split_blocks/self_destruct keep pandas from consolidating everything into fresh 2-D copies
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+# The columnar file is only trusted if it was made from the CSV as it is now
+def columnar_is_current(csv_path, path):
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(SOURCE_KEY) == source_stamp(csv_path)
+
+
+def convert_csv(csv_path):
+    path = columnar_path(csv_path)
+    write_columnar(read_text_csv(csv_path), path, source_csv=csv_path)
+    return path
+
+
+# (path, columns) -> (file stamp, frame) of everything loaded in this process
+_loaded = {}
+
+
+# Typed frame for a cleaned package CSV: from its memory-mapped columnar copy when that is up to date,
+# otherwise from the CSV itself (same dtypes, just slower). Every caller in the process shares one parse
+# per file version; each gets its own shallow copy so dropping rows or adding columns stays local.
+@metrics.timed()
+def load_packages(csv_path, columns=None):
+    path = columnar_path(csv_path)
+    source = path if columnar_is_current(csv_path, path) else csv_path
+    key = (os.path.abspath(source), tuple(columns) if columns is not None else None)
+    stamp = source_stamp(source)
+    if key not in _loaded or _loaded[key][0] != stamp:
+        if source == path:
+            df = read_columnar(path, columns)
+        else:
+            df = to_columnar(read_text_csv(csv_path))
+            df = df[columns] if columns is not None else df
+        _loaded[key] = (stamp, df)
+    return _loaded[key][1].copy(deep=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a typed, memory-mappable .feather copy of cleaned CSVs.")
+    parser.add_argument("csv", nargs="+")
+    args = parser.parse_args()
+
+    for csv_path in args.csv:
+        print(f"{csv_path} -> {convert_csv(csv_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# pip install pandas pyarrow requests geopy addfips
+#
+# One entry point from a raw mailroom export to the dashboard-ready CSV:
+#
+#   ingest -> clean -> origin-enrich -> county -> fips -> publish
+#
+# Every stage's output is cached in .pipeline_cache/ under a key made from its input's key, the source
+# code of the modules the stage runs (this file included), the data files it reads and the options that
+# change its result. Re-running only executes the stages after the first one whose key changed; use
+# --force to redo a stage anyway (e.g. to retry lookups that failed last time).
+#
+#   python pipeline.py --raw packages.csv
+#   python pipeline.py --raw packages.csv --offline          # no network: skip Shippo, use the bundled gazetteer
+#   python pipeline.py --force origin-enrich
+#   python pipeline.py --raw packages.csv --metrics          # stage / API timings in pipeline_metrics.json
+
+import argparse
+import hashlib
+import os
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+from checkpoint import atomic_write_csv
+from export_aggregates import AGGREGATES_FILE, export_csv
+from instrumentation import metrics
+from package_store import columnar_path, write_columnar
+from shippo_lookup import BASE_URL
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(HERE, ".pipeline_cache")
+RAW_FILE = "packages.csv"
+PUBLISH_FILE = "Cleaned_Package_Data_County_FIPS.csv"
+METRICS_FILE = "pipeline_metrics.json"
+
+# Bump to invalidate every cached artifact (e.g. after changing the cache format itself)
+PIPELINE_VERSION = 1
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --- stages -----------------------------------------------------------------------------------
+# Each takes the previous stage's frame and the parsed command line options.
+
+def ingest(_, options):
+    df = pd.read_csv(options.raw)
+    return df.dropna(how="all")
+
+
+def clean(df, options):
+    from cleanPackageData import clean_packages
+    return clean_packages(df)
+
+
+def origin_enrich(df, options):
+    if options.offline:
+        print("  offline: keeping the origin columns as they are")
+        return df
+    from origin_cache import OriginCache
+    from shippo_lookup import OriginLookup, enrich_origins
+    from tracking import api_token
+
+    with OriginCache() as cache, OriginLookup(api_token, base_url=options.base_url, max_workers=options.workers,
+                                              rate=options.rate, cache=cache) as lookup:
+        enrich_origins(df, lookup)
+        print(f"  {cache.stats()}")
+    return df
+
+
+# Loading the gazetteer takes far longer than either offline stage spends using it, so the county and fips
+# stages share one per version of the file
+@lru_cache(maxsize=1)
+def _offline_resolver(path, mtime_ns):
+    from offline_resolver import OfflineResolver
+    return OfflineResolver(path)
+
+
+def offline_resolver():
+    from offline_resolver import GAZETTEER_FILE
+    return _offline_resolver(GAZETTEER_FILE, os.stat(GAZETTEER_FILE).st_mtime_ns)
+
+
+def county(df, options):
+    import fillCountyData
+
+    if options.offline:
+        return fillCountyData.fill_counties_offline(df, offline_resolver())
+    gazetteer = fillCountyData.CountyGazetteer()
+    try:
+        return fillCountyData.fill_counties(df, gazetteer, rate=options.geocode_rate)
+    finally:
+        gazetteer.close()
+
+
+def fips(df, options):
+    import fillCountyFIPS
+
+    if options.offline:
+        return fillCountyFIPS.add_fips_offline(df, offline_resolver())
+    return fillCountyFIPS.add_fips(df)
+
+
+def publish(df, options):
+    atomic_write_csv(df, options.output)
+    print(f"  wrote {options.output}")
+    # Typed, memory-mappable copy the dashboards load instead of re-parsing the CSV
+    columnar = columnar_path(options.output)
+    write_columnar(df, columnar, source_csv=options.output)
+    print(f"  wrote {columnar}")
+    # The pre-aggregated counts the D3 pages draw, next to the CSV they describe
+    aggregates = os.path.join(os.path.dirname(options.output), AGGREGATES_FILE)
+    export_csv(options.output, aggregates)
+    print(f"  wrote {aggregates}")
+    return df
+
+
+class Stage:
+    def __init__(self, name, run, sources=(), options=(), cached=True):
+        self.name = name
+        self.run = run
+        # Modules and data files that decide this stage's output; the stage functions themselves are in
+        # this file
+        self.sources = ["pipeline.py", *sources]
+        # Command line options that change this stage's output
+        self.options = options
+        self.cached = cached
+
+    def key(self, input_key, options):
+        digest = hashlib.sha256(f"{PIPELINE_VERSION}|{self.name}|{input_key}".encode())
+        for source in self.sources:
+            digest.update(file_digest(os.path.join(HERE, source)).encode())
+        for option in self.options:
+            digest.update(f"|{option}={getattr(options, option)}".encode())
+        return digest.hexdigest()
+
+    def artifact(self, key):
+        return os.path.join(CACHE_DIR, f"{self.name}-{key[:16]}.csv")
+
+
+STAGES = [
+    Stage("ingest", ingest),
+    Stage("clean", clean, sources=["cleanPackageData.py", "package_store.py"]),
+    # Which API answered (the real one or a stub) changes the origins; workers and rate do not
+    Stage("origin-enrich", origin_enrich, sources=["shippo_lookup.py", "origin_cache.py", "rate_limit.py"],
+          options=["offline", "base_url"]),
+    Stage("county", county, sources=["fillCountyData.py", "offline_resolver.py", "us_zip_county_gazetteer.csv.gz"],
+          options=["offline"]),
+    Stage("fips", fips, sources=["fillCountyFIPS.py", "offline_resolver.py", "us_zip_county_gazetteer.csv.gz"],
+          options=["offline"]),
+    Stage("publish", publish, cached=False),
+]
+
+
+def run_pipeline(options):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if options.metrics:
+        metrics.enable()
+
+    # Keys only depend on the raw file, the code and the options, so they can all be worked out up front
+    keys = []
+    input_key = file_digest(options.raw)
+    for stage in STAGES:
+        input_key = stage.key(input_key, options)
+        keys.append(input_key)
+
+    # Start after the last stage whose artifact is still valid
+    start = 0
+    for index, (stage, key) in enumerate(zip(STAGES, keys)):
+        if not stage.cached or stage.name in options.force or not os.path.exists(stage.artifact(key)):
+            break
+        start = index + 1
+
+    # Artifacts from older keys will never be read again
+    for stage, key in zip(STAGES, keys):
+        current = os.path.basename(stage.artifact(key))
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith(stage.name + "-") and name != current:
+                os.remove(os.path.join(CACHE_DIR, name))
+
+    report = []
+    df = None
+    if start > 0:
+        began = time.perf_counter()
+        df = pd.read_csv(STAGES[start - 1].artifact(keys[start - 1]), dtype=str)
+        for stage in STAGES[:start]:
+            report.append((stage.name, "cached", None, len(df), 0.0))
+        report[-1] = (STAGES[start - 1].name, "cached", None, len(df), time.perf_counter() - began)
+
+    for stage, key in zip(STAGES[start:], keys[start:]):
+        print(f"[{stage.name}]")
+        rows_in = None if df is None else len(df)
+        began = time.perf_counter()
+        with metrics.span("pipeline_stage", stage=stage.name):
+            df = stage.run(df, options)
+        if stage.cached:
+            atomic_write_csv(df, stage.artifact(key))
+        report.append((stage.name, "ran", rows_in, len(df), time.perf_counter() - began))
+
+    print()
+    print(f"{'stage':<15}{'status':<8}{'rows in':>10}{'rows out':>10}{'seconds':>10}")
+    for name, status, rows_in, rows_out, seconds in report:
+        rows_in = "" if rows_in is None else rows_in
+        print(f"{name:<15}{status:<8}{rows_in:>10}{rows_out:>10}{seconds:>10.2f}")
+    print(f"{'total':<15}{'':<8}{'':>10}{'':>10}{sum(r[4] for r in report):>10.2f}")
+
+    if metrics.enabled:
+        stages = [{"stage": name, "status": status, "rows_in": rows_in, "rows_out": rows_out, "seconds": seconds}
+                  for name, status, rows_in, rows_out, seconds in report]
+        path = options.metrics or METRICS_FILE
+        metrics.write_summary(path, raw=options.raw, stages=stages)
+        print(f"Wrote metrics to {path}")
+    return df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Raw mailroom export -> dashboard-ready CSV.")
+    parser.add_argument("--raw", default=RAW_FILE, help="Mailroom export to start from")
+    parser.add_argument("--output", default=PUBLISH_FILE)
+    parser.add_argument("--offline", action="store_true",
+                        help="No network: skip the Shippo lookups and use the bundled gazetteer for counties")
+    parser.add_argument("--force", nargs="+", default=[], choices=[stage.name for stage in STAGES],
+                        help="Re-run these stages (and everything after them) even if cached")
+    parser.add_argument("--base-url", default=BASE_URL, help="Shippo tracking API base URL")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent Shippo requests")
+    parser.add_argument("--rate", type=float, default=10.0, help="Maximum Shippo requests per second")
+    parser.add_argument("--geocode-rate", type=float, default=1.0, help="Maximum Nominatim requests per second")
+    parser.add_argument("--metrics", nargs="?", const=METRICS_FILE, metavar="PATH",
+                        help=f"Record stage and API timings and write them as JSON (default {METRICS_FILE})")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run_pipeline(parse_args())
@@ -0,0 +1,113 @@
+# pip install pandas numpy
+#
+# Mergeable quantile sketches of the processing time, so the dashboard can show medians and p90 / p99 for any
+# filter instead of means that a few packages left for months drag around.
+#
+# The sketch is a DDSketch-style log histogram: a value x lands in bucket ceil(log_gamma(x)) with
+# gamma = (1 + a) / (1 - a), and any quantile read back from the bucket counts is within a relative error
+# `a` (1% by default) of the exact one, however heavy the tail. Merging two sketches is adding their bucket
+# counts, so a SketchTable keeps one sketch per day x carrier x locker bank x origin state as rows of
+# (cell, bucket, count); a filter masks those rows and sums counts per bucket, never touching the packages.
+# New rows (e.g. appended to the CSV) are added to a table without rebuilding it (see `extended`).
+
+import numpy as np
+import pandas as pd
+
+from package_cubes import FILTER_COLUMNS, with_unknown
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Everything at or below a minute (including 0) shares the lowest bucket
+MIN_HOURS = 1 / 60
+MIN_BUCKET = int(np.ceil(np.log(MIN_HOURS) / np.log(GAMMA)))
+DIMENSIONS = ["day"] + FILTER_COLUMNS
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+def bucket_keys(values):
+    values = np.asarray(values, dtype=float)
+    keys = np.ceil(np.log(np.maximum(values, MIN_HOURS)) / np.log(GAMMA))
+    return np.maximum(keys, MIN_BUCKET).astype(np.int32)
+
+
+# The value each bucket reports: within RELATIVE_ACCURACY of everything in (gamma^(k-1), gamma^k]
+def bucket_values(keys):
+    return 2 * GAMMA ** np.asarray(keys, dtype=float) / (GAMMA + 1)
+
+
+class QuantileSketch:
+    def __init__(self, keys=(), counts=()):
+        # Sorted bucket keys and how many values fell in each
+        self.keys = np.asarray(keys, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=float)
+        keys, counts = np.unique(bucket_keys(values[~np.isnan(values)]), return_counts=True)
+        return cls(keys, counts)
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def merge(self, other):
+        keys, inverse = np.unique(np.concatenate([self.keys, other.keys]), return_inverse=True)
+        return QuantileSketch(keys, np.bincount(inverse, weights=np.concatenate([self.counts, other.counts]),
+                                                minlength=len(keys)).astype(np.int64))
+
+    # Values at the given quantiles (0..1), NaN for an empty sketch
+    def quantiles(self, qs=QUANTILES):
+        if len(self) == 0:
+            return [float("nan") for _ in qs]
+        cumulative = np.cumsum(self.counts)
+        # Rank of the q-quantile, as numpy's "lower" interpolation would pick it
+        ranks = np.floor(np.asarray(qs, dtype=float) * (cumulative[-1] - 1))
+        return bucket_values(self.keys[np.searchsorted(cumulative, ranks, side="right")]).tolist()
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    # Approximate counts per bin of `edges`: each bucket's count goes to the bin of its reported value
+    def histogram(self, edges):
+        edges = np.asarray(edges, dtype=float)
+        bins = np.clip(np.searchsorted(edges, bucket_values(self.keys), side="right") - 1, 0, len(edges) - 2)
+        return np.bincount(bins, weights=self.counts, minlength=len(edges) - 1).astype(np.int64)
+
+
+class SketchTable:
+    # df needs "Routed Date Time", the filter columns and `value`, as in the dashboard's prepared frame
+    def __init__(self, df=None, value="Total Processing Time", cells=None):
+        self.value = value
+        self.cells = cells if cells is not None else self._cells(df)
+
+    def _cells(self, df):
+        known = df[self.value].notna()
+        df = df[known]
+        keys = pd.DataFrame({
+            "day": df["Routed Date Time"].dt.normalize(),
+            **{column: with_unknown(df[column]) for column in FILTER_COLUMNS},
+            "bucket": bucket_keys(df[self.value].to_numpy()),
+        })
+        return keys.groupby(DIMENSIONS + ["bucket"], observed=True).size().rename("count").reset_index()
+
+    # A new table with `df`'s rows added: their sketches are built and merged in, the old rows are not re-read
+    def extended(self, df):
+        cells = pd.concat([self.cells, self._cells(df)], ignore_index=True)
+        for column in FILTER_COLUMNS:
+            cells[column] = cells[column].astype(str).astype("category")
+        merged = cells.groupby(DIMENSIONS + ["bucket"], observed=True)["count"].sum().reset_index()
+        return SketchTable(value=self.value, cells=merged)
+
+    # The merged sketch for the same filters as PackageCube.select
+    def sketch(self, start=None, end=None, carriers=None, banks=None, states=None):
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if start is not None:
+            mask &= (cells["day"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (cells["day"] <= pd.Timestamp(end)).to_numpy()
+        for column, chosen in zip(FILTER_COLUMNS, (carriers, banks, states)):
+            if chosen:
+                mask &= cells[column].isin(chosen).to_numpy()
+        per_bucket = cells[mask].groupby("bucket")["count"].sum()
+        return QuantileSketch(per_bucket.index.to_numpy(), per_bucket.to_numpy())
@@ -0,0 +1,195 @@
+# pip install pandas numpy plotly
+#
+# Sankey diagrams computed from the data instead of hand-built node lists.
+#
+# A SankeyFlow takes an ordered list of columns, e.g. Origin State -> Carrier -> Locker Bank -> pickup latency,
+# and counts the packages along every path in one groupby over the rows. Node totals and the links between
+# neighbouring levels are then summed from those (few) paths. Each level keeps its `max_nodes` biggest values
+# and folds the rest into "Other", so the diagram stays readable however many states or banks there are.
+#
+#   python sankey_flow.py                                            # Origin State -> Carrier -> Locker Bank
+#   python sankey_flow.py --levels Carrier "Locker Bank" "Pickup Latency" --max-nodes 6 --output flow.html
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from package_cubes import with_unknown
+from package_store import load_packages
+
+OTHER = "Other"
+MAX_NODES = 8
+DEFAULT_LEVELS = ["Origin State", "Carrier", "Locker Bank"]
+
+# Hours from storage to pickup, bucketed for a "Pickup Latency" level
+LATENCY_EDGES = [0, 24, 72, 168, np.inf]
+LATENCY_LABELS = ["< 1 day", "1-3 days", "3-7 days", "> 1 week"]
+LINK_COLOR = "rgba(150,150,150,0.4)"
+
+
+def latency_bucket(hours, edges=LATENCY_EDGES, labels=LATENCY_LABELS):
+    return pd.cut(hours, edges, labels=labels, right=False)
+
+
+# `values` as a categorical where everything outside `keep` is `other`. Without `keep`, the max_values - 1
+# biggest values (by weight) are kept. Missing values count as "Unknown".
+def fold_other(values, keep=None, max_values=MAX_NODES, weights=None, other=OTHER):
+    values = with_unknown(values)
+    categories = values.cat.categories
+    codes = values.cat.codes.to_numpy()
+    if keep is None:
+        totals = np.bincount(codes, weights=weights, minlength=len(categories))
+        present = np.flatnonzero(totals)
+        if len(present) <= max_values:
+            return values.cat.remove_unused_categories()
+        order = present[np.argsort(-totals[present], kind="stable")]
+        kept = np.zeros(len(categories), dtype=bool)
+        kept[order[:max_values - 1]] = True
+    else:
+        kept = categories.isin(list(keep))
+    # Old code -> new code, with every folded category pointing at `other` (the last one)
+    mapping = np.where(kept, np.cumsum(kept) - 1, kept.sum())
+    folded = pd.Categorical.from_codes(mapping[codes], list(categories[kept]) + [other])
+    return pd.Series(folded, index=values.index, name=values.name).cat.remove_unused_categories()
+
+
+class SankeyFlow:
+    # weight: column holding how many packages a row stands for (e.g. the cube's "count"); one each by default.
+    # value: column averaged per node and link (a per-row sum when `weight` is given, like the cube's "total").
+    # keep: {column: values} to keep instead of the biggest max_nodes - 1.
+    def __init__(self, df, levels, value=None, weight=None, max_nodes=MAX_NODES, keep=None, other=OTHER):
+        if not levels:
+            raise ValueError("A flow needs at least one level")
+        keep = keep or {}
+        self.levels = list(levels)
+        self.value = value
+
+        weights = df[weight].to_numpy(dtype=float) if weight else np.ones(len(df))
+        columns = {level: fold_other(df[level], keep.get(level), max_nodes, weights, other) for level in self.levels}
+        columns["packages"] = weights
+        if value:
+            values = df[value].to_numpy(dtype=float)
+            known = ~np.isnan(values)
+            columns["value_sum"] = np.where(known, values, 0.0)
+            # Only packages with a value count towards its mean
+            columns["value_weight"] = np.where(known, weights, 0.0)
+        # The single pass over the rows: packages (and value sums) per distinct path through all levels
+        self.paths = pd.DataFrame(columns, index=df.index).groupby(self.levels, observed=True).sum().reset_index()
+        self.paths = self.paths[self.paths["packages"] > 0]
+
+        self.nodes = self._nodes(other)
+        self.links = self._links()
+
+    def _stats(self, grouped):
+        stats = grouped[["packages"] + (["value_sum", "value_weight"] if self.value else [])].sum()
+        if self.value:
+            stats["mean"] = stats["value_sum"] / stats["value_weight"].where(stats["value_weight"] > 0)
+            stats = stats.drop(columns=["value_sum", "value_weight"])
+        return stats
+
+    def _nodes(self, other):
+        nodes = []
+        for depth, level in enumerate(self.levels):
+            stats = self._stats(self.paths.groupby(level, observed=True)).reset_index()
+            stats = stats.rename(columns={level: "label"})
+            stats["label"] = stats["label"].astype(str)
+            # Biggest first, "Other" always last in its column
+            stats["folded"] = stats["label"] == other
+            stats = stats.sort_values(["folded", "packages"], ascending=[True, False], kind="stable")
+            nodes.append(stats.drop(columns="folded").assign(level=depth, column=level))
+        nodes = pd.concat(nodes, ignore_index=True)
+        return nodes[["level", "column", "label", "packages"] + (["mean"] if self.value else [])]
+
+    def _links(self):
+        index = {(level, label): i for i, (level, label) in enumerate(zip(self.nodes["level"], self.nodes["label"]))}
+        links = []
+        for depth, (left, right) in enumerate(zip(self.levels, self.levels[1:])):
+            stats = self._stats(self.paths.groupby([left, right], observed=True)).reset_index()
+            stats = stats[stats["packages"] > 0]
+            stats["source"] = [index[(depth, str(label))] for label in stats[left]]
+            stats["target"] = [index[(depth + 1, str(label))] for label in stats[right]]
+            links.append(stats.drop(columns=[left, right]))
+        if not links:
+            return pd.DataFrame(columns=["source", "target", "packages"])
+        links = pd.concat(links, ignore_index=True)
+        return links[["source", "target", "packages"] + (["mean"] if self.value else [])]
+
+    def node_labels(self):
+        labels = [f"{label}<br>{int(packages):,} packages"
+                  for label, packages in zip(self.nodes["label"], self.nodes["packages"])]
+        if self.value:
+            labels = [label + (f"<br>{mean:.1f} h avg." if pd.notna(mean) else "<br>N/A h avg.")
+                      for label, mean in zip(labels, self.nodes["mean"])]
+        return labels
+
+    # The node / link dicts for go.Sankey. colors: {label: color} for nodes; their links take the colour too.
+    def sankey(self, colors=None):
+        colors = colors or {}
+        node_colors = [colors.get(label) for label in self.nodes["label"]]
+        link_colors = [translucent(node_colors[source]) if node_colors[source] else LINK_COLOR
+                       for source in self.links["source"]]
+        node = dict(label=self.node_labels(), pad=15, thickness=20, line=dict(color="black", width=0.5),
+                    x=[depth / max(len(self.levels) - 1, 1) * 0.98 + 0.01 for depth in self.nodes["level"]],
+                    y=node_positions(self.nodes), hovertemplate="%{label}<extra></extra>")
+        if any(node_colors):
+            node["color"] = [color or "#888888" for color in node_colors]
+        link = dict(source=self.links["source"].tolist(), target=self.links["target"].tolist(),
+                    value=self.links["packages"].tolist(), color=link_colors,
+                    hovertemplate="%{value:,} packages<extra></extra>")
+        if self.value:
+            link["customdata"] = self.links["mean"].round(1).tolist()
+            link["hovertemplate"] = "%{value:,} packages<br>%{customdata} h avg.<extra></extra>"
+        return dict(node=node, link=link)
+
+    def figure(self, title=None, colors=None):
+        fig = go.Figure(go.Sankey(arrangement="snap", **self.sankey(colors)))
+        fig.update_layout(title_text=title or " → ".join(self.levels), font_size=12)
+        return fig
+
+
+# Nodes stacked top to bottom in their column, each getting space in proportion to its packages
+def node_positions(nodes):
+    positions = np.zeros(len(nodes))
+    for _, column in nodes.groupby("level").groups.items():
+        shares = nodes.loc[column, "packages"].to_numpy(dtype=float)
+        shares = shares / shares.sum()
+        positions[column] = np.clip(np.cumsum(shares) - shares / 2, 0.01, 0.99)
+    return positions.tolist()
+
+
+def translucent(color, alpha=0.5):
+    if color.startswith("#") and len(color) == 7:
+        return f"rgba({int(color[1:3], 16)},{int(color[3:5], 16)},{int(color[5:7], 16)},{alpha})"
+    if color.startswith("rgba("):
+        return color.rsplit(",", 1)[0] + f",{alpha})"
+    if color.startswith("rgb("):
+        return color.replace("rgb(", "rgba(").replace(")", f",{alpha})")
+    return color
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw a Sankey diagram of packages through the given columns.")
+    parser.add_argument("--input", default="Cleaned_Package_Data_County_FIPS.csv")
+    parser.add_argument("--levels", nargs="+", default=DEFAULT_LEVELS,
+                        help='Columns in flow order; "Pickup Latency" buckets Stored → Delivered hours')
+    parser.add_argument("--value", default="Total Processing Time", help="Column averaged per node and link")
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES)
+    parser.add_argument("--output", help="Write the figure to this HTML file instead of showing it")
+    args = parser.parse_args()
+
+    df = load_packages(args.input)
+    if "Pickup Latency" in args.levels:
+        df["Pickup Latency"] = latency_bucket(df["Stored → Delivered"])
+    flow = SankeyFlow(df, args.levels, value=args.value, max_nodes=args.max_nodes)
+    fig = flow.figure()
+    if args.output:
+        fig.write_html(args.output)
+        print(f"Wrote {args.output} ({len(flow.nodes)} nodes, {len(flow.links)} links)")
+    else:
+        fig.show()
+
+
+if __name__ == "__main__":
+    main()
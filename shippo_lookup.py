@@ -0,0 +1,173 @@
+# pip install pandas requests
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+from rate_limit import TokenBucket
+
+BASE_URL = 'https://api.goshippo.com/tracks'
+SUPPORTED_CARRIERS = ['usps', 'ups', 'fedex']
+ORIGIN_COLUMNS = ['Origin City', 'Origin State', 'Origin Zip', 'Origin Country']
+EMPTY_ADDRESS = ('', '', '', '')
+
+# Responses worth trying again: rate limited or a temporary server side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Normalize the carrier / tracking number columns the same way the original per-row loop did
+def normalize_keys(df):
+    carriers = df['Carrier'].fillna('').astype(str).str.strip().str.lower()
+    tracking_numbers = df['Tracking #'].fillna('').astype(str).str.strip().str.rstrip('_')
+    return carriers, tracking_numbers
+
+
+# Pull the origin fields out of a Shippo track response
+def parse_address(data):
+    address_from = data.get('address_from') if data else None
+    if not address_from:
+        return None
+    return (
+        address_from.get('city', '') or '',
+        address_from.get('state', '') or '',
+        address_from.get('zip', '') or '',
+        address_from.get('country', '') or ''
+    )
+
+
+# Looks up origin addresses with a pooled keep-alive session shared by a bounded set of worker threads.
+# Every request (including retries) takes a token from the bucket, so `rate` is a hard cap on requests/second.
+# With an OriginCache attached, cached answers are returned without touching the API.
+class OriginLookup:
+    def __init__(self, api_token, base_url=BASE_URL, max_workers=8, rate=10.0, burst=None,
+                 retries=5, backoff=0.5, max_backoff=30.0, timeout=15.0, cache=None):
+        self.cache = cache
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"ShippoToken {api_token}"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.requests_made = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass
+        return min(self.max_backoff, self.backoff * (2 ** attempt))
+
+    # Returns the decoded JSON body, or None if the request failed for good
+    def fetch_track(self, carrier, tracking_number):
+        url = f"{self.base_url}/{carrier}/{tracking_number}"
+        for attempt in range(self.retries + 1):
+            waited = time.perf_counter()
+            self.bucket.acquire()
+            metrics.observe("api_wait_seconds", time.perf_counter() - waited, service="shippo")
+            with self._lock:
+                self.requests_made += 1
+            response = None
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                metrics.observe("api_request_seconds", time.perf_counter() - started, service="shippo",
+                                status=response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError as e:
+                # 4xx other than 429 will not get better by asking again
+                print(f"Error fetching data for {carrier} {tracking_number}: {e}")
+                break
+            except (requests.exceptions.RequestException, ValueError) as e:
+                if response is None:
+                    metrics.observe("api_request_seconds", time.perf_counter() - started, service="shippo",
+                                    status="error")
+                error = str(e)
+            if attempt < self.retries:
+                time.sleep(self._retry_delay(response, attempt))
+        else:
+            print(f"Error fetching data for {carrier} {tracking_number}: {error} (gave up after {self.retries + 1} attempts)")
+        with self._lock:
+            self.failures += 1
+        return None
+
+    def get_origin_address(self, carrier, tracking_number):
+        if self.cache is not None:
+            cached = self.cache.get(carrier, tracking_number)
+            metrics.increment("origin_cache_lookups_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+        data = self.fetch_track(carrier, tracking_number)
+        if data is None:
+            # Failed lookups are not cached so the next run tries again
+            return EMPTY_ADDRESS
+        address = parse_address(data)
+        if self.cache is not None:
+            self.cache.put(carrier, tracking_number, address)
+        return address or EMPTY_ADDRESS
+
+    # Resolve many (carrier, tracking_number) keys concurrently; duplicates are only requested once
+    @metrics.timed()
+    def lookup_many(self, keys, progress_every=100):
+        unique_keys = list(dict.fromkeys(keys))
+        total = len(unique_keys)
+        results = {}
+        if not total:
+            return results
+        print(f"Looking up {total} unique tracking numbers with {self.max_workers} workers "
+              f"at <= {self.bucket.rate:g} requests/s...")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for done, (key, address) in enumerate(
+                    zip(unique_keys, pool.map(lambda k: self.get_origin_address(*k), unique_keys)), 1):
+                results[key] = address
+                if done % progress_every == 0 or done == total:
+                    elapsed = time.perf_counter() - start
+                    print(f"Looked up {done} of {total} ({done / elapsed:.1f} lookups/s)")
+        return results
+
+
+# Fill the origin columns of every USPS/UPS/FedEx row with one vectorized assignment
+@metrics.timed()
+def enrich_origins(df, lookup):
+    for column in ORIGIN_COLUMNS:
+        if column not in df.columns:
+            df[column] = ''
+    carriers, tracking_numbers = normalize_keys(df)
+    eligible = carriers.isin(SUPPORTED_CARRIERS) & (tracking_numbers != '')
+    print(f"{int(eligible.sum())} of {len(df)} rows are USPS, UPS, or FedEx.")
+
+    keys = list(zip(carriers[eligible], tracking_numbers[eligible]))
+    results = lookup.lookup_many(keys)
+    if keys:
+        origins = pd.DataFrame([results[key] for key in keys], index=df.index[eligible], columns=ORIGIN_COLUMNS)
+        df.loc[eligible, ORIGIN_COLUMNS] = origins
+    return df
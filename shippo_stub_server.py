@@ -0,0 +1,89 @@
+# Local stand-in for the Shippo /tracks endpoint so tracking.py can be exercised without an API key or quota.
+# Run it directly (python shippo_stub_server.py --port 8765) and point tracking.py at it with
+#   python tracking.py --base-url http://127.0.0.1:8765/tracks
+
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CITIES = [
+    ("Worcester", "MA", "01609"), ("Boston", "MA", "02110"), ("Seattle", "WA", "98109"),
+    ("Bend", "OR", "97701"), ("Chicago", "IL", "60601"), ("Los Angeles", "CA", "90001"),
+    ("Dallas", "TX", "75201"), ("Philadelphia", "PA", "19103"), ("Newark", "NJ", "07102"),
+]
+
+
+class StubShippoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'tracks':
+            self._send(404, {"detail": "Not found"})
+            return
+
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_every and count % server.fail_every == 0:
+            self._send(429 if count % 2 else 503, {"detail": "Try again"}, {"Retry-After": "0"})
+            return
+
+        carrier, tracking_number = parts[1], parts[2]
+        checksum = zlib.crc32(tracking_number.encode())
+        if checksum % 10 == 0:
+            # Some tracking numbers never report an origin
+            self._send(200, {"carrier": carrier, "tracking_number": tracking_number, "address_from": None})
+            return
+        city, state, zip_code = CITIES[checksum % len(CITIES)]
+        self._send(200, {
+            "carrier": carrier,
+            "tracking_number": tracking_number,
+            "address_from": {"city": city, "state": state, "zip": zip_code, "country": "US"},
+        })
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Start the stub on a background thread; returns (server, base_url)
+def start_stub_server(port=0, latency=0.0, fail_every=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubShippoHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_every = fail_every
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/tracks"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve fake Shippo tracking responses locally.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds to wait before answering")
+    parser.add_argument('--fail-every', type=int, default=0, help="Answer every Nth request with 429/503")
+    args = parser.parse_args()
+    httpd, url = start_stub_server(args.port, args.latency, args.fail_every)
+    print(f"Stub Shippo API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
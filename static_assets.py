@@ -0,0 +1,96 @@
+# pip install flask            (optional: pip install brotli)
+#
+# Serves the county map pages and the data files they fetch from the dashboard's own Flask server, instead of
+# a second single-threaded http.server on port 8000.
+#
+# Text files (HTML, CSV, JSON, ...) are compressed once per file version, with brotli and gzip, and kept in
+# memory; each request gets the smallest encoding the client accepts. Responses carry an ETag, Last-Modified
+# and Cache-Control, so a browser revalidating an unchanged file gets an empty 304.
+
+import gzip
+import mimetypes
+import os
+import threading
+
+from flask import abort, request
+from werkzeug.security import safe_join
+from werkzeug.wrappers import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Only these files are served: the pages and what they fetch. The repository directory also holds source code,
+# .pipeline_cache/ (intermediate package data with addresses), journals and metrics, none of which may leak.
+SERVED_FILES = {"index.html", "countymaplog.html", "countymaplinear.html", "wpi-dashboard.html",
+                "zzz-d3-dashboard.html", "zz_filtering_test.html", "package_aggregates.json",
+                "counties-albers-simplified.json", "counties-albers-10m.json", "Cleaned_Package_Data_County_FIPS.csv",
+                "ProcessBook.pdf"}
+COMPRESSED_EXTENSIONS = {".html", ".csv", ".json", ".js", ".css", ".svg"}
+mimetypes.add_type("text/csv", ".csv")
+
+
+class StaticAssets:
+    def __init__(self, root=HERE, max_age=60, files=SERVED_FILES):
+        self.root = root
+        # Names relative to root
+        self.files = frozenset(files)
+        # Browsers reuse a file this long before revalidating it with its ETag
+        self.max_age = max_age
+        # path -> (size, mtime_ns, {encoding: body})
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def _encodings(self, path, stat):
+        with self._lock:
+            cached = self._compressed.get(path)
+            if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                return cached[2]
+        with open(path, "rb") as source:
+            body = source.read()
+        encodings = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encodings["br"] = brotli.compress(body, quality=11)
+        with self._lock:
+            self._compressed[path] = (stat.st_size, stat.st_mtime_ns, encodings)
+        return encodings
+
+    def serve(self, filename):
+        path = safe_join(self.root, filename)
+        extension = os.path.splitext(filename)[1].lower()
+        if filename not in self.files or path is None or not os.path.isfile(path):
+            abort(404)
+        stat = os.stat(path)
+        version = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+        encoding = None
+        if extension in COMPRESSED_EXTENSIONS:
+            accepted = request.accept_encodings
+            encodings = self._encodings(path, stat)
+            for candidate in ("br", "gzip"):
+                if candidate in encodings and accepted[candidate]:
+                    encoding = candidate
+                    break
+
+        if encoding is None:
+            with open(path, "rb") as source:
+                response = Response(source.read(), mimetype=mimetypes.guess_type(path)[0])
+        else:
+            response = Response(encodings[encoding], mimetype=mimetypes.guess_type(path)[0])
+            response.content_encoding = encoding
+        if extension in COMPRESSED_EXTENSIONS:
+            response.vary.add("Accept-Encoding")
+        # Each encoding is a different body, so each gets its own ETag
+        response.set_etag(f"{version}-{encoding or 'identity'}")
+        response.last_modified = stat.st_mtime
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+    # Serve the files under `url_prefix` on a Flask app (e.g. a Dash app's .server)
+    def register(self, server, url_prefix="/files"):
+        server.add_url_rule(f"{url_prefix}/<path:filename>", "static_assets", self.serve)
+        return self
@@ -0,0 +1,84 @@
+# pip install pandas numpy
+#
+# Total processing time over routed time, downsampled on the server for the line chart.
+#
+# The rows are kept once as sorted numpy arrays. A request for a visible window cuts it out with a binary
+# search and, when it holds more than `max_buckets` packages, summarizes it as min / mean / max per equal-width
+# time bucket. The browser never gets more than `max_buckets` points per line however much history is loaded,
+# and zooming in asks again for the narrower window at full resolution.
+
+import numpy as np
+import pandas as pd
+
+from package_cubes import FILTER_COLUMNS, with_unknown
+
+MAX_BUCKETS = 400
+
+
+class ProcessingSeries:
+    def __init__(self, df):
+        known = df["Routed Date Time"].notna() & df["Total Processing Time"].notna()
+        df = df[known]
+        order = np.argsort(df["Routed Date Time"].to_numpy(dtype="datetime64[ns]"), kind="stable")
+        self.times = df["Routed Date Time"].to_numpy(dtype="datetime64[ns]")[order].view("int64")
+        self.values = df["Total Processing Time"].to_numpy(dtype=float)[order]
+        # Filter columns as category codes in the same order, so filtering is an integer comparison
+        self.codes = {}
+        self.categories = {}
+        for column in FILTER_COLUMNS:
+            values = with_unknown(df[column])
+            self.codes[column] = values.cat.codes.to_numpy()[order]
+            self.categories[column] = values.cat.categories
+        for array in (self.times, self.values, *self.codes.values()):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.times)
+
+    def _mask(self, lo, hi, carriers, banks, states):
+        mask = None
+        for column, chosen in zip(FILTER_COLUMNS, (carriers, banks, states)):
+            if chosen:
+                wanted = self.categories[column].get_indexer(list(chosen))
+                match = np.isin(self.codes[column][lo:hi], wanted[wanted >= 0])
+                mask = match if mask is None else mask & match
+        return mask
+
+    # Min / mean / max of the processing time per time bucket between start and end (None = open ended).
+    # Windows with no more than max_buckets packages come back row by row (min = mean = max).
+    def bands(self, start=None, end=None, carriers=None, banks=None, states=None, max_buckets=MAX_BUCKETS):
+        lo = 0 if start is None else np.searchsorted(self.times, pd.Timestamp(start).value, side="left")
+        hi = len(self.times) if end is None else np.searchsorted(self.times, pd.Timestamp(end).value, side="right")
+        times, values = self.times[lo:hi], self.values[lo:hi]
+        mask = self._mask(lo, hi, carriers, banks, states)
+        if mask is not None:
+            times, values = times[mask], values[mask]
+
+        if len(times) <= max_buckets:
+            return pd.DataFrame({"time": pd.to_datetime(times), "min": values, "mean": values, "max": values,
+                                 "count": np.ones(len(times), dtype=np.int64)})
+
+        edges = np.linspace(times[0], times[-1], max_buckets + 1)
+        # Times are sorted, so each non-empty bucket is one contiguous run of rows
+        starts = np.unique(np.searchsorted(times, edges[:-1], side="left"))
+        starts = starts[starts < len(times)]
+        counts = np.diff(np.append(starts, len(times)))
+        return pd.DataFrame({
+            # Each bucket is drawn at the mean time of its packages
+            "time": pd.to_datetime((np.add.reduceat(times.astype(float), starts) / counts).astype("int64")),
+            "min": np.minimum.reduceat(values, starts),
+            "mean": np.add.reduceat(values, starts) / counts,
+            "max": np.maximum.reduceat(values, starts),
+            "count": counts,
+        })
+
+
+# The visible x range from a Dash relayoutData event, or (None, None) for "everything"
+def relayout_range(relayout):
+    if not relayout or relayout.get("xaxis.autorange"):
+        return None, None
+    if "xaxis.range[0]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    if "xaxis.range" in relayout:
+        return tuple(relayout["xaxis.range"][:2])
+    return None, None
@@ -1,68 +1,82 @@
+# pip install pandas requests
+
+import argparse
+
 import pandas as pd
-import requests
 
-# Read the CSV file into a DataFrame
-print("Reading CSV file...")
-df = pd.read_csv('packages.csv')
-print("CSV file loaded successfully.")
+import incremental
+from origin_cache import OriginCache
+from shippo_lookup import OriginLookup, enrich_origins, ORIGIN_COLUMNS
 
 # Define the API token and base URL
 api_token = 'shippo_live_59d15a9e675bf94ac1f7487697a6a1e34f29f8d3'
 base_url = 'https://api.goshippo.com/tracks'
 
-# Add new columns to the DataFrame
-df['Origin City'] = ''
-df['Origin State'] = ''
-df['Origin Zip'] = ''
-df['Origin Country'] = ''
-print("Added new columns for origin address.")
+input_file = 'packages.csv'
+output_file = 'updated_packages.csv'
+cache_file = 'origin_cache.sqlite'
 
 
-# Function to get origin address from Shippo API
-def get_origin_address(carrier, tracking_number):
-    url = f"{base_url}/{carrier}/{tracking_number}"
-    headers = {
-        "Authorization": f"ShippoToken {api_token}"
-    }
-    print(f"Making API request for carrier: {carrier}, tracking number: {tracking_number}")
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an error for bad responses
-        data = response.json()
-        address_from = data.get('address_from')
-        if address_from:
-            print(f"Received address from API: {address_from}")
-            return (
-                address_from.get('city', ''),
-                address_from.get('state', ''),
-                address_from.get('zip', ''),
-                address_from.get('country', '')
-            )
-        else:
-            print("No 'address_from' found in the response.")
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data for {carrier} {tracking_number}: {e}")
-    return '', '', '', ''
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fill in package origin addresses from the Shippo tracking API.")
+    parser.add_argument('--input', default=input_file)
+    parser.add_argument('--output', default=output_file)
+    parser.add_argument('--base-url', default=base_url, help="Tracking API base URL (point at a stub server for testing)")
+    parser.add_argument('--workers', type=int, default=8, help="Maximum concurrent requests")
+    parser.add_argument('--rate', type=float, default=10.0, help="Maximum requests per second")
+    parser.add_argument('--burst', type=float, default=None, help="Token bucket size (defaults to --rate)")
+    parser.add_argument('--retries', type=int, default=5, help="Retries for 429/5xx responses")
+    parser.add_argument('--cache', default=cache_file, help="SQLite file remembering earlier lookups")
+    parser.add_argument('--no-cache', action='store_true', help="Always ask the API")
+    parser.add_argument('--cache-ttl-days', type=float, default=180)
+    parser.add_argument('--cache-negative-ttl-days', type=float, default=2,
+                        help="How long to remember tracking numbers that had no origin")
+    parser.add_argument('--cache-max-entries', type=int, default=500_000)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only look up rows that are new or changed since the last --incremental run")
+    return parser.parse_args()
 
 
-# Iterate over the DataFrame rows
-print("Processing each row in the DataFrame...")
-for index, row in df.iterrows():
-    carrier = row['Carrier'].strip().lower()
-    tracking_number = row['Tracking #'].strip().rstrip('_')
+def main():
+    args = parse_args()
 
-    # Check if the carrier is USPS, UPS, or FedEx
-    if carrier in ['usps', 'ups', 'fedex']:
-        print(f"Processing row {index}: Carrier = {carrier}, Tracking Number = {tracking_number}")
-        city, state, zip_code, country = get_origin_address(carrier, tracking_number)
-        df.at[index, 'Origin City'] = city
-        df.at[index, 'Origin State'] = state
-        df.at[index, 'Origin Zip'] = zip_code
-        df.at[index, 'Origin Country'] = country
+    # Read the CSV file into a DataFrame
+    print("Reading CSV file...")
+    if args.incremental:
+        full_df = incremental.read_csv_text(args.input)
+        plan = incremental.plan_delta(full_df, args.output)
+        df = plan.delta(full_df).copy()
     else:
-        print(f"Skipping row {index}: Carrier {carrier} is not USPS, UPS, or FedEx.")
+        df = pd.read_csv(args.input)
+    print("CSV file loaded successfully.")
 
-# Save the updated DataFrame to a new CSV file
-output_file = 'updated_packages.csv'
-df.to_csv(output_file, index=False)
-print(f"Updated DataFrame saved to {output_file}.")
+    # Add new columns to the DataFrame
+    for column in ORIGIN_COLUMNS:
+        df[column] = ''
+    print("Added new columns for origin address.")
+
+    cache = None
+    if not args.no_cache:
+        cache = OriginCache(args.cache, ttl_days=args.cache_ttl_days,
+                            negative_ttl_days=args.cache_negative_ttl_days, max_entries=args.cache_max_entries)
+    try:
+        with OriginLookup(api_token, base_url=args.base_url, max_workers=args.workers, rate=args.rate,
+                          burst=args.burst, retries=args.retries, cache=cache) as lookup:
+            enrich_origins(df, lookup)
+            print(f"Made {lookup.requests_made} API requests ({lookup.failures} lookups failed).")
+    finally:
+        if cache is not None:
+            cache.close()
+            print(cache.stats())
+
+    # Save the updated DataFrame to a new CSV file
+    if args.incremental:
+        incremental.save_with_fingerprints(plan.assemble(df), plan, args.output)
+    else:
+        df.to_csv(args.output, index=False)
+        incremental.discard_fingerprints(args.output)
+    print(f"Updated DataFrame saved to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()